@@ -1,46 +1,64 @@
+import base64
+import hashlib
+import json
 import os
 import shutil
+import tempfile
 import time
-import hashlib
 import threading
 import uuid
 
-import pandas as pd
-
 from flask import Flask, request, jsonify, Response, send_from_directory
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy.exc import IntegrityError
 
 from config import Config
 
-from db.common import engine, GenderEnum
-from db.prepare import db_session, table
-from db.setup import init_db
-from db.tables import Conversion, Demographic, FileConversionAssociation, \
-    MarkerMap, MotionCaptureData, MotionCaptureMetaData
-from db.queries import marker_mapping_exists, conversion_id, marker_map_id, motion_capture_data_id, conversion_exists, \
-    file_conversion_association_exists, conversions_associated_with, marker_map, marker_conversion_for, motion_capture_metadata_for, marker_map_ids_for_conversion, demographic
-from db.queries import markers as get_markers
+from cache.common import is_valid_key
+from cache.results import result_cache, job_fingerprint
+from cache.trc_files import trc_file_cache
+
+from db.common import GenderEnum
+from db.generations import bump_generations, generation_tokens
+from db.prepare import db_session
+from db.setup import init_db, schema_exists
+from db.trajectories import trajectory_matrix
+from db.tables import Conversion, ConversionMarkerMapAssociation, Demographic, FileConversionAssociation, \
+    MarkerMap, MotionCaptureData
+from db.queries import conversion_id, marker_map_ids, motion_capture_data_ids, trc_ids_associated_with, \
+    conversions_associated_with, marker_conversion_for, motion_capture_metadata_for, landmarks_for_conversion, demographic, \
+    motion_capture_data_exists, motion_capture_data_page, public_demographics_page, \
+    PageKeyError, query_cache_info, invalidate_tables
+from db.queries import markers as get_markers, trajectories as get_trajectories
 from db.upgrade import need_upgrade, upgrade
 
 from trc import TRCData
 
-from process.job_manager import create_job, send_job, get_job_state, list_jobs, remove_job
-from process.manager import start_workflow_processor
+from ingest.bulk import is_archive, spool_archive, spool_file, ingest_files
+from ingest.pool import submit_ingest, ingest_status
+from ingest.store import ingest_trc, ingest_result
+
+from process.job_controls import JobState, JobRemoval
+from process.job_manager import create_job, send_job, get_job_state, job_schedule, remove_job, share_active_job
+from process.manager import start_workflow_processor, worker_pool_status
 
 ALLOWED_EXTENSIONS = {'trc'}
+# Lists may be stored but must be revalidated, markers of a file can never change.
+LIST_CACHE_CONTROL = 'no-cache'
+MARKERS_CACHE_CONTROL = 'public, max-age=31536000, immutable'
 
 app = Flask(__name__)
 app.config['WORK_DIR'] = Config.WORK_DIR
-app.config['SQLALCHEMY_DATABASE_URI'] = Config.SQLALCHEMY_DATABASE_URI
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['CORS_HEADERS'] = 'Content-Type'
 app.secret_key = Config.SECRET_KEY
 
 CORS(app)
-db = SQLAlchemy(app)
 
-if not os.path.exists(Config.DATABASE_FILE):
+if Config.PROXY_COUNT > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.PROXY_COUNT, x_proto=Config.PROXY_COUNT)
+
+if not schema_exists():
     lock = threading.Lock()
     with lock:
         init_db()
@@ -59,50 +77,40 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def store_in_database(file_name, file_content):
+def ingest_response(result):
+    if 'file_hash' in result:
+        return Response(f"{{message: '{result['message']}',"
+                        f" file_name: '{result['file_name']}', file_hash: '{result['file_hash']}'}}",
+                        status=result['status'], mimetype='application/json')
+
+    return Response(f"{{message: '{result['message']}', file_name: '{result['file_name']}'}}",
+                    status=result['status'], mimetype='application/json')
+
+
+def store_in_database(file_name, file_stream):
     if file_name == '':
         return Response(f"{{message: 'Invalid file name', file_name: '{file_name}'}}",
                         status=400, mimetype='application/json')
-    if file_content and allowed_file(file_name):
-        readable_hash = hashlib.sha256(file_content.encode('utf-8')).hexdigest()
-        data = TRCData()
-        try:
-            data.parse(file_content)
-        except IOError:
-            return Response(f"{{message: 'Invalid file content', file_name: '{file_name}'}}", status=400,
-                            mimetype='application/json')
-        marker_table = {'Frame#': data['Frame#'], 'Time': data['Time']}
-        for marker in data['Markers']:
-            marker_table[marker] = ['<sep>'.join(map(str, coordinates)) for coordinates in data[marker]]
-        df = pd.DataFrame(marker_table)
-
-        upload_status = 200
-        upload_message = 'Content already exists in database.'
-        if not engine.has_table(readable_hash):
-            df.to_sql(readable_hash, con=engine)
-            m = MotionCaptureData(file_name, readable_hash)
-            db_session.add(m)
-            joined_markers = '<sep>'.join(data['Markers'])
-            md = MotionCaptureMetaData(readable_hash, data['PathFileType'], data['DataFormat'], data['FileName'],
-                                       data_rate=data['DataRate'], camera_rate=data['CameraRate'],
-                                       num_frames=data['NumFrames'], num_markers=data['NumMarkers'],
-                                       units=data['Units'], orig_data_rate=data['OrigDataRate'],
-                                       # orig_data_start_frame=data['OrigDataStartFrame'], orig_num_frames=data['OrigNumFrames'],
-                                       markers=joined_markers)
-            db_session.add(md)
-            db_session.commit()
-            upload_status = 201
-            upload_message = 'Content added to database.'
-
-        return Response(f"{{message: '{upload_message}',"
-                        f" file_name: '{file_name}', file_hash: '{readable_hash}'}}",
-                        status=upload_status,
-                        mimetype='application/json')
+    if allowed_file(file_name):
+        return ingest_response(ingest_trc(file_name, file_stream))
 
     return Response(f"{{message: 'Invalid file content', file_name: '{file_name}'}}",
                     status=400, mimetype='application/json')
 
 
+def spool_for_ingest(file_name, file_stream):
+    if file_name == '' or not allowed_file(file_name):
+        return store_in_database(file_name, file_stream)
+
+    ingest_id = submit_ingest(file_name, file_stream)
+    if ingest_id is None:
+        return Response(f"{{message: 'Too many uploads waiting to be processed', file_name: '{file_name}'}}",
+                        status=503, mimetype='application/json')
+
+    return Response(f"{{message: 'Content accepted for processing.', file_name: '{file_name}', ingest_id: '{ingest_id}'}}",
+                    status=202, mimetype='application/json')
+
+
 @app.route('/api/v1/upload', methods=['GET', 'POST'])
 def upload_file():
     response = Response("{message: 'File upload error'}", status=400, mimetype='application/json')
@@ -110,38 +118,105 @@ def upload_file():
     if len(content) == 1 and 'file' in content:
         file_uploaded = content['file']
         file_name = file_uploaded.filename
-        file_content = file_uploaded.read().decode('utf8')
-        response = store_in_database(file_name, file_content)
+        if request.args.get('mode', Config.INGEST_MODE) == 'async':
+            response = spool_for_ingest(file_name, file_uploaded.stream)
+        else:
+            response = store_in_database(file_name, file_uploaded.stream)
 
     return response
 
 
-@app.route('/api/v1/create/conversion', methods=['POST'])
-def create_conversion():
-    content = request.get_json()
-    for marker_mapping in content['marker_maps']:
-        if not marker_mapping_exists(marker_mapping):
-            db_session.add(MarkerMap(marker_mapping['source'], marker_mapping['target']))
+@app.route('/api/v1/upload/bulk', methods=['POST'])
+def upload_files():
+    os.makedirs(Config.INGEST_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=Config.INGEST_DIR) as spool_directory:
+        results = []
+        files = []
+        for _, file_uploaded in request.files.items(multi=True):
+            file_name = file_uploaded.filename
+            if file_name == '':
+                results.append(ingest_result(400, 'Invalid file name', file_name))
+            elif allowed_file(file_name):
+                results.append(None)
+                files.append((file_name, spool_file(file_uploaded.stream, spool_directory)))
+            elif is_archive(file_name):
+                for archived_name, path in spool_archive(file_name, file_uploaded.stream, spool_directory,
+                                                         allowed_file):
+                    if path is None:
+                        results.append(ingest_result(400, 'Invalid archive', archived_name))
+                    else:
+                        results.append(None)
+                        files.append((archived_name, path))
+            else:
+                results.append(ingest_result(400, 'Invalid file content', file_name))
 
-    db_session.commit()
+        if not results:
+            return Response("{message: 'File upload error'}", status=400, mimetype='application/json')
 
-    ids = []
-    for marker_mapping in content['marker_maps']:
-        ids.append(str(marker_map_id(marker_mapping)))
+        ingested = iter(ingest_files(files))
+        results = [next(ingested) if result is None else result for result in results]
 
-    marker_map_ids = ','.join(ids)
-    if not conversion_exists(content['name'], marker_map_ids):
-        db_session.add(Conversion(content['name'], marker_map_ids))
-        db_session.commit()
+    return jsonify({'files': results})
+
+
+@app.route('/api/v1/upload/status', methods=['GET'])
+def get_upload_status():
+    id_ = request.args.get('id', None)
+    status = ingest_status(id_)
+    if status is None:
+        return jsonify({'id': id_, 'status': 'unknown'})
+
+    return jsonify({'id': id_, 'status': status['state'], 'result': status['result']})
+
+
+def _store_conversion(name, marker_mappings, files):
+    existing_marker_maps = marker_map_ids(marker_mappings)
+    missing_marker_maps = [m for m in dict.fromkeys(marker_mappings) if m not in existing_marker_maps]
+    if missing_marker_maps:
+        db_session.execute(MarkerMap.__table__.insert(),
+                           [{'source': source, 'target': target} for source, target in missing_marker_maps])
+        existing_marker_maps = marker_map_ids(marker_mappings)
+
+    ids = [existing_marker_maps[m] for m in marker_mappings]
+    conversion_marker_map_ids = ','.join([str(id_) for id_ in ids])
+    id_for_conversion = conversion_id(name, conversion_marker_map_ids)
+    if id_for_conversion == -1:
+        conversion = Conversion(name, conversion_marker_map_ids)
+        db_session.add(conversion)
+        db_session.flush()
+        id_for_conversion = conversion.id
+        db_session.execute(ConversionMarkerMapAssociation.__table__.insert(),
+                           [{'conversion_id': id_for_conversion, 'marker_map_id': id_, 'position': position}
+                            for position, id_ in enumerate(ids)])
+
+    trc_ids = set(motion_capture_data_ids(files).values())
+    missing_trc_ids = trc_ids - trc_ids_associated_with(id_for_conversion, trc_ids)
+    if missing_trc_ids:
+        db_session.execute(FileConversionAssociation.__table__.insert(),
+                           [{'conversion_id': id_for_conversion, 'trc_id': trc_id} for trc_id in sorted(missing_trc_ids)])
 
-    id_for_conversion = conversion_id(content['name'], marker_map_ids)
 
-    trc_id = motion_capture_data_id(content['file'])
-    if not file_conversion_association_exists(id_for_conversion, trc_id):
-        fca = FileConversionAssociation(id_for_conversion, trc_id)
-        db_session.add(fca)
+@app.route('/api/v1/create/conversion', methods=['POST'])
+def create_conversion():
+    content = request.get_json()
+    marker_mappings = [(m['source'], m['target']) for m in content['marker_maps']]
+    files = content.get('files', [])
+    if 'file' in content:
+        files = [content['file']] + files
+    files = [(f['title'], f['hash']) for f in files]
+
+    try:
+        _store_conversion(content['name'], marker_mappings, files)
+        bump_generations(db_session, [Conversion.__tablename__])
+        db_session.commit()
+    except IntegrityError:
+        # Another request stored some of the same rows first, what is missing now can be stored.
+        db_session.rollback()
+        _store_conversion(content['name'], marker_mappings, files)
+        bump_generations(db_session, [Conversion.__tablename__])
         db_session.commit()
 
+    invalidate_tables([Conversion.__tablename__])
     return jsonify({'id': content['name'], 'public': True})
 
 
@@ -152,34 +227,129 @@ def create_demographic():
     gender = GenderEnum.to_enum(content['gender'])
     d = Demographic(content['id'], content['height'], content['mass'], content['age'], gender, public)
     db_session.add(d)
+    bump_generations(db_session, [Demographic.__tablename__])
     db_session.commit()
+    invalidate_tables([Demographic.__tablename__])
     return jsonify({'id': content['id'], 'public': public})
 
 
+def _conditional_response(etag, cache_control, make_response):
+    """
+    Respond with 304 Not Modified if the request already has etag, otherwise with make_response().
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = make_response()
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def _table_etag(table_name):
+    # The table generation changes whenever the table is written, the query arguments select what is listed.
+    arguments = sorted(request.args.items(multi=True))
+    token, = generation_tokens(db_session, [table_name])
+    return hashlib.sha1(f"{table_name}:{token}:{arguments}".encode()).hexdigest()
+
+
+def _list_response(table_name, make_response):
+    return _conditional_response(_table_etag(table_name), LIST_CACHE_CONTROL, make_response)
+
+
+class PageArgumentError(ValueError):
+    pass
+
+
+@app.errorhandler(PageArgumentError)
+@app.errorhandler(PageKeyError)
+def invalid_page(e):
+    return Response(f"{{message: '{e}'}}", status=400, mimetype='application/json')
+
+
+def _encode_cursor(key):
+    if key is None:
+        return None
+
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise PageArgumentError(f"Invalid cursor: {cursor}")
+
+    if not isinstance(key, list):
+        raise PageArgumentError(f"Invalid cursor: {cursor}")
+
+    return key
+
+
+def _page_args():
+    after = request.args.get('after', None)
+    limit = request.args.get('limit', None)
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise PageArgumentError(f"Invalid limit: {limit}")
+        if not 0 < limit <= Config.MAX_PAGE_SIZE:
+            raise PageArgumentError(f"Limit must be between 1 and {Config.MAX_PAGE_SIZE}")
+
+    return {
+        'after': None if after is None else _decode_cursor(after),
+        'limit': limit,
+        'prefix': request.args.get('prefix', None),
+        'count': request.args.get('count', 'false').lower() == 'true',
+    }
+
+
+def _page_response(name, page, to_json):
+    rows, next_key, total = page
+    result = {name: [to_json(r) for r in rows], 'next': _encode_cursor(next_key)}
+    if total is not None:
+        result['count'] = total
+
+    return jsonify(result)
+
+
 @app.route('/api/v1/files', methods=['GET'])
 def get_available_files():
-    query_result = MotionCaptureData.query.all()
-    trc_files = [{'title': r.title, 'hash': r.hash} for r in query_result]
-    return jsonify({'files': trc_files})
+    page_args = _page_args()
+
+    def make_response():
+        page = motion_capture_data_page(**page_args)
+        return _page_response('files', page, lambda r: {'title': r.title, 'hash': r.hash})
+
+    return _list_response(MotionCaptureData.__tablename__, make_response)
 
 
 @app.route('/api/v1/demographics', methods=['GET'])
 def get_available_demographics():
-    query_result = Demographic.query.filter(Demographic.public)
-    demographics = [{'id': r.demographic_id} for r in query_result]
-    return jsonify({'demographics': demographics})
+    page_args = _page_args()
+
+    def make_response():
+        page = public_demographics_page(**page_args)
+        return _page_response('demographics', page, lambda r: {'id': r.demographic_id})
+
+    return _list_response(Demographic.__tablename__, make_response)
 
 
 @app.route('/api/v1/conversions', methods=['GET'])
 def get_available_conversions():
-    title = request.args.get('title', None)
-    hash_ = request.args.get('hash', None)
-    conversions = []
-    if title is not None and hash_ is not None:
-        query_result = conversions_associated_with(title, hash_)
-        conversions = [{"id": o.id, "name": o.name} for o in query_result]
+    def make_response():
+        title = request.args.get('title', None)
+        hash_ = request.args.get('hash', None)
+        conversions = []
+        if title is not None and hash_ is not None:
+            query_result = conversions_associated_with(title, hash_)
+            conversions = [{"id": o.id, "name": o.name} for o in query_result]
 
-    return jsonify({'conversions': conversions})
+        return jsonify({'conversions': conversions})
+
+    return _list_response(Conversion.__tablename__, make_response)
 
 
 @app.route('/api/v1/job/status', methods=['GET'])
@@ -204,16 +374,35 @@ def get_job_download():
 
 @app.route('/api/v1/job/list', methods=['GET'])
 def get_job_listing():
-    jobs = list_jobs()
+    jobs = job_schedule()
+    # Submitters are other users' identities or addresses, only the caller's own jobs show theirs.
+    caller = _submitter()
+    for job in jobs:
+        if job['submitter'] != caller:
+            del job['submitter']
 
     return jsonify({'message': 'success', 'jobs': jobs})
 
 
+@app.route('/api/v1/workers', methods=['GET'])
+def get_workers():
+    return jsonify(worker_pool_status(Config.WORK_DIR))
+
+
+@app.route('/api/v1/cache/queries', methods=['GET'])
+def get_query_cache_info():
+    # The caches are per process, so report which process answered.
+    return jsonify({'pid': os.getpid(), 'caches': query_cache_info()})
+
+
 @app.route('/api/v1/job/remove', methods=['GET'])
 def get_remove_job():
     id_ = request.args.get('id', None)
     status = remove_job(id_)
-    if status:
+    if status == JobRemoval.RELEASED:
+        # The job is shared with other submissions, which still need it.
+        return jsonify({'message': 'successfully removed job'})
+    if status == JobRemoval.REMOVED:
         # Throws error on failure by default.
         try:
             shutil.rmtree(os.path.join(Config.WORK_DIR, id_))
@@ -228,19 +417,18 @@ def get_remove_job():
 
 @app.route('/api/v1/markers/<string:hash_>', methods=["GET"])
 def markers(hash_):
-    return jsonify({'markers': get_markers(hash_)})
+    # Markers are keyed by the hash of the file content, so they never change.
+    return _conditional_response(hash_, MARKERS_CACHE_CONTROL, lambda: jsonify({'markers': get_markers(hash_)}))
 
 
-def process_trc_db_data(db_data, markers_):
-    index = getattr(db_data, 'Frame#')
-    time_ = getattr(db_data, 'Time')
-    coordinates = []
-    data_dict = {'Frame#': index, 'Time': time_}
-    for marker in markers_:
-        parts = getattr(db_data, marker).split('<sep>')
-        data_dict[marker] = [float(p) for p in parts]
-
-    return data_dict
+def _populate_trc_trajectories(db_data, trajectories):
+    frames, times, labels, coordinates = trajectory_matrix(trajectories)
+    db_data['Frame#'] = frames.tolist()
+    db_data['Time'] = times.tolist()
+    # Each frame maps to its time and a view of the (markers x 3) coordinates for that frame.
+    db_data.update(zip(db_data['Frame#'], zip(db_data['Time'], coordinates)))
+    for index, label in enumerate(labels):
+        db_data[label] = coordinates[:, index]
 
 
 def _populate_trc_metadata(db_data, metadata):
@@ -258,6 +446,31 @@ def _populate_trc_metadata(db_data, metadata):
     db_data['OrigNumFrames'] = metadata.orig_num_frames
 
 
+def _render_trc(hash_, trc_file):
+    trc_data = {}
+    _populate_trc_trajectories(trc_data, get_trajectories(hash_))
+    trc_data['Markers'] = get_markers(hash_)
+    _populate_trc_metadata(trc_data, motion_capture_metadata_for(hash_))
+
+    trc_in = TRCData()
+    trc_in.update(trc_data)
+    trc_in.save(trc_file)
+    trc_file_cache.add(hash_, trc_file)
+
+
+def _submitter():
+    """
+    Identify who sent the request, for sharing the workers fairly between submitters.
+    The user authenticated by the server is used first, then Config.SUBMITTER_HEADER, then the remote address.
+    """
+    submitter = request.remote_user
+    if not submitter and Config.SUBMITTER_HEADER:
+        submitter = request.headers.get(Config.SUBMITTER_HEADER)
+
+    # The submitter column holds at most 255 characters.
+    return (submitter or request.remote_addr)[:255]
+
+
 @app.route('/api/v1/process', methods=["POST"])
 def run_calculations():
     data = request.get_json()
@@ -265,49 +478,28 @@ def run_calculations():
         return Response(f"{{message: 'Invalid server setup, directory does not exist: {app.config['WORK_DIR']}'}}",
                         status=400, mimetype='application/json')
 
-    demographic_data = demographic(data['demographic']['id'])
-    data_table = table(data['file']['hash'])
-
-    motion_capture_metadata = motion_capture_metadata_for(data['file']['hash'])
-    marker_map_ids = marker_map_ids_for_conversion(data['conversion']['name'])
-    ids = marker_map_ids.split(',')
-    mapping = [marker_map(int(id_)) for id_ in ids]
-    landmarks = {}
-    for map_ in mapping:
-        landmarks[map_[0]] = map_[1]
-
-    markers_ = get_markers(data['file']['hash'])
-    trc_db_data = db_session.query(data_table).all()
-    trc_data = {}
-    for frame in [process_trc_db_data(o, markers_) for o in trc_db_data]:
-        marker_coordinates = [None] * len(markers_)
-        for key in frame:
-            if key in markers_:
-                index = markers_.index(key)
-                marker_coordinates[index] = frame[key]
-
-            if key in trc_data:
-                trc_data[key].append(frame[key])
-            else:
-                trc_data[key] = [frame[key]]
+    priority = data.get('priority', 0)
+    if not isinstance(priority, int) or isinstance(priority, bool) or abs(priority) > Config.JOB_MAX_PRIORITY:
+        return Response(f"{{message: 'Invalid priority, must be an integer from -{Config.JOB_MAX_PRIORITY} to {Config.JOB_MAX_PRIORITY}: {priority}'}}",
+                        status=400, mimetype='application/json')
 
-        trc_data[frame['Frame#']] = (frame['Time'], marker_coordinates)
+    # Checked before anything is made on disk for the job.
+    trc_hash = data['file']['hash']
+    if not is_valid_key(trc_hash):
+        return Response(f"{{message: 'Invalid file hash: {trc_hash}'}}", status=400, mimetype='application/json')
+    if not motion_capture_data_exists(trc_hash):
+        return Response(f"{{message: 'File not found: {trc_hash}'}}", status=404, mimetype='application/json')
 
-    trc_data['Markers'] = markers_
-    _populate_trc_metadata(trc_data, motion_capture_metadata)
+    demographic_data = demographic(data['demographic']['id'])
+
+    landmarks = landmarks_for_conversion(data['conversion']['name'])
 
-    trc_in = TRCData()
-    trc_in.update(trc_data)
     job_id = str(uuid.uuid4())
 
     job_working_directory = os.path.join(Config.WORK_DIR, job_id)
     trc_in_dir = os.path.join(job_working_directory, 'input')
-    os.makedirs(trc_in_dir, exist_ok=True)
     osim_out_dir = os.path.join(job_working_directory, 'model')
-    os.makedirs(osim_out_dir, exist_ok=True)
-
     trc_file = os.path.join(trc_in_dir, 'input.trc')
-    trc_in.save(trc_file)
 
     input_config = {
         "Location": trc_file,
@@ -329,7 +521,22 @@ def run_calculations():
         'muscle': muscle_config
     }
 
-    job = create_job(job_id, job_config)
+    fingerprint = job_fingerprint(job_config, trc_hash, Config.WORKFLOW_DIR)
+    # An identical job that is queued or running makes the same model, share it.
+    active_job_id = share_active_job(fingerprint, priority)
+    if active_job_id is not None:
+        return jsonify({'message': 'Model processing started successfully.', 'id': active_job_id})
+
+    os.makedirs(trc_in_dir, exist_ok=True)
+    os.makedirs(osim_out_dir, exist_ok=True)
+    if result_cache.link(fingerprint, os.path.join(job_working_directory, 'scaled_model.zip')):
+        send_job(create_job(job_id, job_config, fingerprint, JobState.FINISHED, priority, _submitter()))
+        return jsonify({'message': 'Model processing started successfully.', 'id': job_id})
+
+    if not trc_file_cache.link(trc_hash, trc_file):
+        _render_trc(trc_hash, trc_file)
+
+    job = create_job(job_id, job_config, fingerprint, priority=priority, submitter=_submitter())
     # Start consumer when a job is sent.
     send_job(job)
     start_workflow_processor(Config.PROCESSING_PYTHON_EXE, Config.WORKFLOW_DIR, Config.WORK_DIR)
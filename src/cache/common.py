@@ -0,0 +1,132 @@
+import os
+import re
+import shutil
+import tempfile
+
+from filelock import FileLock
+
+_LOCK_FILE = ".lock"
+
+# Keys are SHA-256 hex digests, so that a key can never name a file outside the cache directory.
+_KEY = re.compile('[0-9a-f]{64}')
+
+
+def is_valid_key(key):
+    return isinstance(key, str) and _KEY.fullmatch(key) is not None
+
+
+class DirectoryCache(object):
+    """
+    A size bounded, content addressed, cache of files kept in a directory, keyed by SHA-256 hex digests.
+    Entries are evicted least recently used first, using the modification time of an entry as its last use.
+    The cache is safe to share between processes.
+    """
+
+    def __init__(self, location, max_size, suffix=''):
+        """
+        :param location: Directory to keep the cached files in, created when first needed.
+        :param max_size: Maximum total size of the cached files in bytes.
+        :param suffix: Suffix to add to the key to make the file name of an entry.
+        """
+        self._location = location
+        self._max_size = max_size
+        self._suffix = suffix
+
+    def _path(self, key):
+        if not is_valid_key(key):
+            raise ValueError(f"Invalid cache key: {key!r}")
+
+        return os.path.join(self._location, f"{key}{self._suffix}")
+
+    def _lock(self):
+        return FileLock(os.path.join(self._location, _LOCK_FILE))
+
+    def get(self, key):
+        """
+        Get the location of the cached file for key, marking it as recently used.
+
+        :param key: Key of the entry.
+        :return: Path to the cached file or None if key is not cached.
+        """
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return path
+
+    def link(self, key, destination):
+        """
+        Place the cached file for key at destination.
+        A hard link is used where possible, otherwise the file is copied.
+
+        :return: True if key was cached, False otherwise.
+        """
+        path = self.get(key)
+        if path is None:
+            return False
+
+        try:
+            os.link(path, destination)
+        except FileNotFoundError:
+            # Evicted between get and link.
+            return False
+        except OSError:
+            try:
+                shutil.copyfile(path, destination)
+            except FileNotFoundError:
+                return False
+
+        return True
+
+    def add(self, key, source):
+        """
+        Add the file source to the cache as the entry for key, then evict entries over the size limit.
+        The entry is a hard link to source where possible, otherwise a copy of source.
+
+        :return: Path to the cached file.
+        """
+        os.makedirs(self._location, exist_ok=True)
+        handle, staging_path = tempfile.mkstemp(dir=self._location, prefix='.', suffix='.part')
+        os.close(handle)
+        os.remove(staging_path)
+        try:
+            os.link(source, staging_path)
+        except OSError:
+            shutil.copyfile(source, staging_path)
+
+        path = self._path(key)
+        os.replace(staging_path, path)
+        self.evict()
+        return path
+
+    def remove(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """
+        Remove least recently used entries until the total size of the cache is within its maximum size.
+        """
+        with self._lock():
+            entries = []
+            total_size = 0
+            with os.scandir(self._location) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(self._suffix) and not entry.name.startswith('.'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total_size += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total_size <= self._max_size:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
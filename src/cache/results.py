@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+
+from cache.common import DirectoryCache
+from config import Config
+
+# Scaled model archives keyed by the fingerprint of the job that made them, see job_fingerprint.
+result_cache = DirectoryCache(Config.RESULT_CACHE_DIR, Config.RESULT_CACHE_SIZE, '.zip')
+
+# Entries of a job configuration that are locations in the job working directory, they differ for every job.
+_LOCATION_KEYS = ('working_directory', 'Location', 'osim_output_dir')
+
+# Workflow files whose content is part of the workflow version, the same files each job gets a copy of.
+_VERSIONED_SUFFIXES = ('.conf', '.proj')
+
+
+def _without_locations(config):
+    if isinstance(config, dict):
+        return {key: _without_locations(value) for key, value in config.items() if key not in _LOCATION_KEYS}
+
+    return config
+
+
+def workflow_version(workflow_location):
+    """
+    Get a digest of the workflow configuration and Config.RESULT_CACHE_SALT.
+    The configuration and project files are read, for every other entry only its name is used.
+    """
+    digest = hashlib.sha256(Config.RESULT_CACHE_SALT.encode())
+    try:
+        entries = sorted(os.scandir(workflow_location), key=lambda e: e.name)
+    except FileNotFoundError:
+        entries = []
+
+    for entry in entries:
+        digest.update(entry.name.encode() + b'\0')
+        if entry.is_file() and entry.name.endswith(_VERSIONED_SUFFIXES):
+            with open(entry.path, 'rb') as f:
+                digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+def job_fingerprint(job_config, trc_hash, workflow_location):
+    """
+    Get the fingerprint of a job, jobs with the same fingerprint make the same scaled model.
+
+    :param job_config: The job configuration, its locations are left out.
+    :param trc_hash: SHA-256 of the input TRC file, which the configuration only refers to by location.
+    :param workflow_location: Location of the workflow that runs the job.
+    :return: Hex digest of the fingerprint.
+    """
+    content = {
+        'config': _without_locations(job_config),
+        'trc': trc_hash,
+        'workflow': workflow_version(workflow_location),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,5 @@
+from cache.common import DirectoryCache
+from config import Config
+
+# Rendered input TRC files keyed by the SHA-256 of the uploaded file.
+trc_file_cache = DirectoryCache(Config.TRC_CACHE_DIR, Config.TRC_CACHE_SIZE, '.trc')
@@ -2,12 +2,60 @@ import os
 
 NOT_SET_FLAG = "<not-set>"
 _DB_FILE = os.environ.get("OMS_BACKEND_SQL_DATABASE", NOT_SET_FLAG)
+_WORK_DIR = os.environ.get("OMS_BACKEND_WORK_DIR", NOT_SET_FLAG)
+_CPU_COUNT = os.cpu_count() or 1
 
 
 class Config(object):
-    WORK_DIR = os.environ.get("OMS_BACKEND_WORK_DIR", NOT_SET_FLAG)
+    WORK_DIR = _WORK_DIR
     DATABASE_FILE = _DB_FILE
-    SQLALCHEMY_DATABASE_URI = f'sqlite:///{_DB_FILE}'
+    # Any SQLAlchemy database URL, when not set the SQLite database file is used.
+    SQLALCHEMY_DATABASE_URI = os.environ.get("OMS_BACKEND_DATABASE_URL", f'sqlite:///{_DB_FILE}')
+    DATABASE_POOL_SIZE = int(os.environ.get("OMS_BACKEND_DATABASE_POOL_SIZE", 5))
+    DATABASE_MAX_OVERFLOW = int(os.environ.get("OMS_BACKEND_DATABASE_MAX_OVERFLOW", 10))
+    DATABASE_POOL_TIMEOUT = int(os.environ.get("OMS_BACKEND_DATABASE_POOL_TIMEOUT", 30))
+    DATABASE_POOL_RECYCLE = int(os.environ.get("OMS_BACKEND_DATABASE_POOL_RECYCLE", 3600))
+    SQLITE_JOURNAL_MODE = os.environ.get("OMS_BACKEND_SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("OMS_BACKEND_SQLITE_SYNCHRONOUS", "NORMAL")
+    # Negative values are in KiB.
+    SQLITE_CACHE_SIZE = int(os.environ.get("OMS_BACKEND_SQLITE_CACHE_SIZE", -65536))
+    SQLITE_MMAP_SIZE = int(os.environ.get("OMS_BACKEND_SQLITE_MMAP_SIZE", 256 * 1024 ** 2))
+    # Milliseconds.
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get("OMS_BACKEND_SQLITE_BUSY_TIMEOUT", 30000))
     SECRET_KEY = os.environ.get("OMS_BACKEND_SECRET_KEY", "not-the-secret-key")
     WORKFLOW_DIR = os.environ.get("OMS_WORKFLOW_DIR", NOT_SET_FLAG)
     PROCESSING_PYTHON_EXE = os.environ.get("OMS_PROCESSING_PYTHON_EXE", NOT_SET_FLAG)
+    # The number of jobs processed at once, 0 for one per physical CPU.
+    WORKFLOW_WORKERS = int(os.environ.get("OMS_BACKEND_WORKFLOW_WORKERS", 1))
+    WORKFLOW_IDLE_SHUTDOWN = float(os.environ.get("OMS_BACKEND_WORKFLOW_IDLE_SHUTDOWN", 300))
+    WORKFLOW_MAX_WAIT = float(os.environ.get("OMS_BACKEND_WORKFLOW_MAX_WAIT", 30))
+    # One of subprocess, resident, or stub.
+    WORKFLOW_RUNNER = os.environ.get("OMS_BACKEND_WORKFLOW_RUNNER", "subprocess")
+    WORKFLOW_RESIDENT_MAX_JOBS = int(os.environ.get("OMS_BACKEND_WORKFLOW_RESIDENT_MAX_JOBS", 50))
+    JOB_QUEUE_BACKEND = os.environ.get("OMS_BACKEND_JOB_QUEUE_BACKEND", "sql")
+    JOB_COMPACTION_INTERVAL = int(os.environ.get("OMS_BACKEND_JOB_COMPACTION_INTERVAL", 60))
+    JOB_ARCHIVE_MAX_AGE = int(os.environ.get("OMS_BACKEND_JOB_ARCHIVE_MAX_AGE", 30 * 24 * 60 * 60))
+    JOB_ARCHIVE_MAX_COUNT = int(os.environ.get("OMS_BACKEND_JOB_ARCHIVE_MAX_COUNT", 100000))
+    JOB_MAX_PRIORITY = int(os.environ.get("OMS_BACKEND_JOB_MAX_PRIORITY", 10))
+    # The most jobs of one submitter running at once, 0 for no limit.
+    JOB_SUBMITTER_MAX_RUNNING = int(os.environ.get("OMS_BACKEND_JOB_SUBMITTER_MAX_RUNNING", 0))
+    # Header set by a trusted proxy with the identity of the submitter, empty to use the remote address.
+    SUBMITTER_HEADER = os.environ.get("OMS_BACKEND_SUBMITTER_HEADER", "")
+    # Number of trusted proxies in front of the application, whose X-Forwarded-For entries give the remote address.
+    PROXY_COUNT = int(os.environ.get("OMS_BACKEND_PROXY_COUNT", 0))
+    TRC_CACHE_DIR = os.environ.get("OMS_BACKEND_TRC_CACHE_DIR", os.path.join(_WORK_DIR, ".cache", "trc"))
+    TRC_CACHE_SIZE = int(os.environ.get("OMS_BACKEND_TRC_CACHE_SIZE", 2 * 1024 ** 3))
+    RESULT_CACHE_DIR = os.environ.get("OMS_BACKEND_RESULT_CACHE_DIR", os.path.join(_WORK_DIR, ".cache", "results"))
+    RESULT_CACHE_SIZE = int(os.environ.get("OMS_BACKEND_RESULT_CACHE_SIZE", 5 * 1024 ** 3))
+    # Change to stop using results made before, e.g. after updating MAP Client plugins.
+    RESULT_CACHE_SALT = os.environ.get("OMS_BACKEND_RESULT_CACHE_SALT", "")
+    MAX_PAGE_SIZE = int(os.environ.get("OMS_BACKEND_MAX_PAGE_SIZE", 1000))
+    QUERY_CACHE_SIZE = int(os.environ.get("OMS_BACKEND_QUERY_CACHE_SIZE", 1024))
+    # Seconds between checks for writes by other processes to the tables of cached queries.
+    QUERY_CACHE_CHECK_INTERVAL = float(os.environ.get("OMS_BACKEND_QUERY_CACHE_CHECK_INTERVAL", 5))
+    INGEST_DIR = os.environ.get("OMS_BACKEND_INGEST_DIR", os.path.join(_WORK_DIR, ".ingest"))
+    INGEST_MODE = os.environ.get("OMS_BACKEND_INGEST_MODE", "sync")
+    INGEST_WORKERS = int(os.environ.get("OMS_BACKEND_INGEST_WORKERS", _CPU_COUNT))
+    INGEST_MAX_PENDING = int(os.environ.get("OMS_BACKEND_INGEST_MAX_PENDING", 64))
+    INGEST_BATCH_SIZE = int(os.environ.get("OMS_BACKEND_INGEST_BATCH_SIZE", 50))
+    INGEST_STATUS_MAX_AGE = int(os.environ.get("OMS_BACKEND_INGEST_STATUS_MAX_AGE", 24 * 60 * 60))
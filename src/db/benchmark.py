@@ -0,0 +1,139 @@
+"""
+Benchmark the lookup queries in db.queries as the tables grow.
+Every table is grown to each of the given sizes in turn and the median latency of each query is reported,
+with indexes the latency should stay flat as the tables grow.
+
+Run from the src directory with::
+
+    python -m db.benchmark [--sizes 1000 10000 100000] [--repeat 200] [--drop-indexes]
+
+A temporary SQLite database is used, the configured database is not touched.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_INSERT_CHUNK = 10000
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark database lookup queries against table size.")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Number of rows to grow every table to, in increasing order.")
+    parser.add_argument("--repeat", type=int, default=200, help="Number of times to run each query per size.")
+    parser.add_argument("--drop-indexes", action='store_true', help="Benchmark without the secondary indexes.")
+    return parser.parse_args()
+
+
+def _rows(start, stop):
+    from db.common import GenderEnum
+
+    rows = {
+        'demographics': [], 'motion_capture_data': [], 'motion_capture_meta_data': [],
+        'marker_map': [], 'conversions': [], 'conversion_marker_map_associations': [],
+        'file_conversion_associations': [],
+    }
+    for i in range(start, stop):
+        hash_ = f"{i:064x}"
+        rows['demographics'].append({'demographic_id': f"d{i}", 'height': 1.8, 'weight': 75.0, 'age': 30.0,
+                                     'gender': GenderEnum.Other, 'public': i % 2 == 0})
+        rows['motion_capture_data'].append({'title': f"t{i}.trc", 'hash': hash_})
+        rows['motion_capture_meta_data'].append({'hash': hash_, 'markers': 'A<sep>B<sep>C'})
+        rows['marker_map'].append({'source': f"s{i}", 'target': f"t{i}"})
+        rows['conversions'].append({'name': f"c{i}", 'marker_map_ids': str(i + 1)})
+        rows['conversion_marker_map_associations'].append({'conversion_id': i + 1, 'marker_map_id': i + 1, 'position': 0})
+        rows['file_conversion_associations'].append({'conversion_id': i + 1, 'trc_id': i + 1})
+
+    return rows
+
+
+def _grow(engine, tables, start, stop):
+    for chunk_start in range(start, stop, _INSERT_CHUNK):
+        rows = _rows(chunk_start, min(chunk_start + _INSERT_CHUNK, stop))
+        with engine.begin() as connection:
+            for name, table_rows in rows.items():
+                connection.execute(tables[name].insert(), table_rows)
+
+
+def _time(query, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query()
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+class _Uncached:
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        query = getattr(self._module, name)
+        return getattr(query, '__wrapped__', query)
+
+
+def _queries(size):
+    from db import queries
+
+    # Time the database, not the query caches.
+    queries = _Uncached(queries)
+    i = random.randrange(size)
+    hash_ = f"{i:064x}"
+    marker_mapping = {'source': f"s{i}", 'target': f"t{i}"}
+    return {
+        'marker_mapping_exists': lambda: queries.marker_mapping_exists(marker_mapping),
+        'marker_map_id': lambda: queries.marker_map_id(marker_mapping),
+        'conversion_exists': lambda: queries.conversion_exists(f"c{i}", str(i + 1)),
+        'conversion_id': lambda: queries.conversion_id(f"c{i}", str(i + 1)),
+        'landmarks_for_conversion': lambda: queries.landmarks_for_conversion(f"c{i}"),
+        'file_conversion_association_exists': lambda: queries.file_conversion_association_exists(i + 1, i + 1),
+        'motion_capture_data_exists': lambda: queries.motion_capture_data_exists(hash_),
+        'motion_capture_data_id': lambda: queries.motion_capture_data_id({'title': f"t{i}.trc", 'hash': hash_}),
+        'motion_capture_metadata_for': lambda: queries.motion_capture_metadata_for(hash_),
+        'markers': lambda: queries._markers(hash_),
+        'conversions_associated_with': lambda: queries.conversions_associated_with(f"t{i}.trc", hash_),
+        'marker_conversion_for': lambda: queries.marker_conversion_for(hash_),
+        'demographic': lambda: queries.demographic(f"d{i}"),
+    }
+
+
+def main():
+    args = _parse_args()
+    directory = tempfile.mkdtemp()
+    os.environ['OMS_BACKEND_DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'benchmark.sqlite')}"
+
+    # Import after the database URL is set.
+    from db.common import engine
+    from db.prepare import Base, db_session
+    import db.tables
+
+    Base.metadata.create_all(engine)
+    tables = Base.metadata.tables
+    if args.drop_indexes:
+        for table_ in tables.values():
+            for index in table_.indexes:
+                index.drop(engine)
+
+    print(f"Database: {engine.url}, indexes: {'dropped' if args.drop_indexes else 'created'}")
+    results = {}
+    current_size = 0
+    for size in args.sizes:
+        _grow(engine, tables, current_size, size)
+        current_size = size
+        for name, query in _queries(size).items():
+            results.setdefault(name, []).append(_time(query, args.repeat))
+            db_session.remove()
+
+    name_width = max(len(name) for name in results)
+    print(f"{'query':<{name_width}}" + ''.join(f"{size:>12}" for size in args.sizes) + "  (median latency, us)")
+    for name, timings in results.items():
+        print(f"{name:<{name_width}}" + ''.join(f"{timing * 1e6:>12.1f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
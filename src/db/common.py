@@ -1,6 +1,9 @@
 import enum
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
 from config import Config
 
 
@@ -27,7 +30,42 @@ class GenderEnum(enum.Enum):
         return gender
 
 
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI, convert_unicode=True)
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={Config.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={Config.SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={Config.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={Config.SQLITE_BUSY_TIMEOUT}")
+    cursor.close()
+
+
+def create_database_engine(uri):
+    """
+    Create an engine for the database at uri, with a connection pool configured from Config.
+    SQLite connections are shared between threads and have the pragmas set in Config applied
+    to every new connection.
+
+    :param uri: SQLAlchemy database URI.
+    :return: The engine.
+    """
+    pool_options = {
+        'poolclass': QueuePool,
+        'pool_size': Config.DATABASE_POOL_SIZE,
+        'max_overflow': Config.DATABASE_MAX_OVERFLOW,
+        'pool_timeout': Config.DATABASE_POOL_TIMEOUT,
+    }
+    if make_url(uri).get_backend_name() == 'sqlite':
+        engine_ = create_engine(uri, convert_unicode=True, connect_args={'check_same_thread': False}, **pool_options)
+        event.listen(engine_, 'connect', _set_sqlite_pragmas)
+    else:
+        engine_ = create_engine(uri, convert_unicode=True, pool_recycle=Config.DATABASE_POOL_RECYCLE,
+                                pool_pre_ping=True, **pool_options)
+
+    return engine_
+
+
+engine = create_database_engine(Config.SQLALCHEMY_DATABASE_URI)
 
 
 def tables():
@@ -0,0 +1,40 @@
+import uuid
+
+from sqlalchemy import select
+
+from db.tables import Generation
+
+_generations = Generation.__table__
+
+
+def bump_generations(connection, names):
+    """
+    Start a new generation for each of the tables names, in the transaction of connection.
+    Must be called in the transaction that writes the tables, so that the new generations are committed
+    with the data, and as close to the commit as possible, as the generation rows stay locked until then.
+
+    :param connection: A session or connection.
+    :param names: Names of the tables written.
+    """
+    # Always in the same order so that concurrent transactions cannot deadlock.
+    for name in sorted(set(names)):
+        token = uuid.uuid4().hex
+        result = connection.execute(_generations.update().where(_generations.c.name == name).values(token=token))
+        if result.rowcount == 0:
+            connection.execute(_generations.insert(), {'name': name, 'token': token})
+
+
+def generation_tokens(connection, names):
+    """
+    Get the current generation tokens of the tables names.
+    A token changes whenever its table is written, so it can be used to tell whether data has changed
+    without reading the data itself, by any process sharing the database.
+
+    :param connection: A session or connection.
+    :param names: Names of the tables.
+    :return: Tuple of the tokens in the order of names, a table not written since the schema was created has
+     an empty token.
+    """
+    tokens = dict(connection.execute(select([_generations.c.name, _generations.c.token]).
+                                     where(_generations.c.name.in_(names))).fetchall())
+    return tuple(tokens.get(name, '') for name in names)
@@ -10,15 +10,5 @@ Base = declarative_base()
 Base.query = db_session.query_property()
 
 
-def table(name):
-    metadata = Base.metadata
-    metadata.reflect(engine)
-
-    return metadata.tables[name]
-
-
 def tables():
-    metadata = Base.metadata
-    metadata.reflect(engine)
-
-    return metadata.tables.keys()
+    return engine.table_names()
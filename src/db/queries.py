@@ -1,7 +1,137 @@
-from sqlalchemy.sql import exists, and_
+import functools
+import threading
+import time
+from collections import OrderedDict
 
+from sqlalchemy import func, true
+from sqlalchemy.sql import exists, and_, or_
+
+from config import Config
+
+from db.generations import generation_tokens
 from db.prepare import db_session
-from db.tables import MarkerMap, Conversion, MotionCaptureData, FileConversionAssociation, MotionCaptureMetaData, Demographic
+from db.tables import MarkerMap, Conversion, MotionCaptureData, FileConversionAssociation, MotionCaptureMetaData, Demographic, \
+    MotionCaptureTrajectory, ConversionMarkerMapAssociation
+
+
+class QueryCache:
+    """
+    Bounded least recently used cache of query results.
+    The cache is per process, see _cached_query for how results written by any process are not served stale.
+    """
+
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key):
+        """
+        :return: Tuple of whether key was found and its value.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                return True, self._entries[key]
+
+            self._misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """
+        Forget key, or everything if key is None.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def info(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {'hits': self._hits,
+                    'misses': self._misses,
+                    'hit_rate': self._hits / lookups if lookups else 0.0,
+                    'size': len(self._entries),
+                    'max_size': self._max_size}
+
+
+_query_caches = {}
+
+# The generation token of each table and when it was read, see _generation_tokens.
+_checked_tokens = {}
+_checked_tokens_lock = threading.Lock()
+
+
+def _generation_tokens(tables):
+    """
+    Get the generation tokens of tables, read from the database at most every Config.QUERY_CACHE_CHECK_INTERVAL
+    seconds, so that most cached lookups do not query the database at all.
+    """
+    now = time.monotonic()
+    with _checked_tokens_lock:
+        checked = [_checked_tokens.get(name) for name in tables]
+    if all(entry is not None and now - entry[1] < Config.QUERY_CACHE_CHECK_INTERVAL for entry in checked):
+        return tuple(token for token, _ in checked)
+
+    tokens = generation_tokens(db_session, tables)
+    with _checked_tokens_lock:
+        _checked_tokens.update((name, (token, now)) for name, token in zip(tables, tokens))
+    return tokens
+
+
+def invalidate_tables(names):
+    """
+    Must be called after a write to the tables names is committed in this process, so that the results
+    cached before it are not used by this process. Other processes stop using them within
+    Config.QUERY_CACHE_CHECK_INTERVAL seconds.
+    """
+    with _checked_tokens_lock:
+        for name in names:
+            _checked_tokens.pop(name, None)
+
+
+def _cached_query(*tables):
+    """
+    Cache the results of a query, a function of one hashable argument, in its own QueryCache.
+    Results are keyed on the argument and the generation tokens of tables, the tables the query reads, so a result
+    is not used once one of them has been written, see invalidate_tables. A query of rows that never change
+    once written, such as rows keyed by the hash of their content, needs no tables.
+    Empty results are not cached, so rows written by other processes are still found.
+    The uncached query is available as __wrapped__.
+    """
+    def decorator(query):
+        cache = _query_caches[query.__name__] = QueryCache(Config.QUERY_CACHE_SIZE)
+
+        @functools.wraps(query)
+        def wrapper(key):
+            cache_key = (key, _generation_tokens(tables)) if tables else key
+            found, value = cache.get(cache_key)
+            if not found:
+                value = query(key)
+                if value:
+                    cache.put(cache_key, value)
+
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def query_cache_info():
+    return {name: cache.info() for name, cache in _query_caches.items()}
 
 
 def marker_mapping_exists(marker_mapping):
@@ -16,6 +146,16 @@ def conversion_exists(name, marker_map_ids):
     return result
 
 
+def motion_capture_data_exists(hash_):
+    result = db_session.query(exists().where(MotionCaptureData.hash == hash_)).scalar()
+    return result
+
+
+def existing_motion_capture_data_hashes(hashes):
+    result = db_session.query(MotionCaptureData.hash).filter(MotionCaptureData.hash.in_(hashes))
+    return {r.hash for r in result}
+
+
 def file_conversion_association_exists(id_for_conversion, trc_id):
     result = db_session.query(exists().where(and_(FileConversionAssociation.conversion_id == id_for_conversion,
                                                   FileConversionAssociation.trc_id == trc_id))).scalar()
@@ -36,6 +176,40 @@ def marker_map_id(marker_mapping):
     return result[0] if result else -1
 
 
+def marker_map_ids(marker_mappings):
+    """
+    Get the ids of the marker maps that exist for the given (source, target) pairs, in one query.
+
+    :param marker_mappings: Iterable of (source, target) pairs.
+    :return: Dict of (source, target) pair to marker map id, for the pairs that exist.
+    """
+    marker_mappings = set(marker_mappings)
+    sources = {source for source, _ in marker_mappings}
+    result = db_session.query(MarkerMap.id, MarkerMap.source, MarkerMap.target).filter(MarkerMap.source.in_(sources))
+    return {(r.source, r.target): r.id for r in result if (r.source, r.target) in marker_mappings}
+
+
+def motion_capture_data_ids(files):
+    """
+    Get the ids of the motion capture data for the given (title, hash) pairs, in one query.
+
+    :param files: Iterable of (title, hash) pairs.
+    :return: Dict of (title, hash) pair to motion capture data id, for the pairs that exist.
+    """
+    files = set(files)
+    hashes = {hash_ for _, hash_ in files}
+    result = db_session.query(MotionCaptureData.id, MotionCaptureData.title, MotionCaptureData.hash). \
+        filter(MotionCaptureData.hash.in_(hashes))
+    return {(r.title, r.hash): r.id for r in result if (r.title, r.hash) in files}
+
+
+def trc_ids_associated_with(id_for_conversion, trc_ids):
+    result = db_session.query(FileConversionAssociation.trc_id). \
+        filter(and_(FileConversionAssociation.conversion_id == id_for_conversion,
+                    FileConversionAssociation.trc_id.in_(set(trc_ids))))
+    return {r.trc_id for r in result}
+
+
 def marker_map(id_):
     result = db_session.query(MarkerMap.target, MarkerMap.source).filter(MarkerMap.id == id_).first()
 
@@ -49,51 +223,158 @@ def motion_capture_data_id(file_info):
     return result[0] if result else -1
 
 
-def marker_map_ids_for_conversion(name):
-    result = Conversion.query.with_entities(Conversion.marker_map_ids).filter(Conversion.name == name).first()
-    return result.marker_map_ids
-
-
+@_cached_query()
 def motion_capture_metadata_for(hash_):
     motion_capture_metadata = db_session.query(MotionCaptureMetaData).filter(MotionCaptureMetaData.hash == hash_).scalar()
+    if motion_capture_metadata is not None:
+        # Detach the metadata so that it can be shared between sessions.
+        db_session.expunge(motion_capture_metadata)
     return motion_capture_metadata
 
 
 def conversions_associated_with(title, hash_):
-    motion_capture_id = db_session.query(MotionCaptureData.id).filter(and_(MotionCaptureData.title == title,
-                                                                           MotionCaptureData.hash == hash_)).scalar()
-    result = db_session.query(FileConversionAssociation.conversion_id). \
-        filter(FileConversionAssociation.trc_id == motion_capture_id)
-    conversions = []
-    if result is not None:
-        conversion_ids = [r.conversion_id for r in result]
-        conversions = db_session.query(Conversion).filter(Conversion.id.in_(conversion_ids)).all()
+    conversions = db_session.query(Conversion). \
+        join(FileConversionAssociation, FileConversionAssociation.conversion_id == Conversion.id). \
+        join(MotionCaptureData, MotionCaptureData.id == FileConversionAssociation.trc_id). \
+        filter(and_(MotionCaptureData.title == title, MotionCaptureData.hash == hash_)). \
+        all()
 
     return conversions
 
 
 def marker_conversion_for(hash_):
-    motion_capture_id = db_session.query(MotionCaptureData.id).filter(MotionCaptureData.hash == hash_).scalar()
-    result = db_session.query(FileConversionAssociation.conversion_id). \
-        filter(FileConversionAssociation.trc_id == motion_capture_id)
-
-    conversion = None
-    if result is not None:
-        conversion_ids = [r.conversion_id for r in result]
-        conversions = db_session.query(Conversion).filter(Conversion.id.in_(conversion_ids)).all()
-        conversion = conversions[0]
+    conversion = db_session.query(Conversion). \
+        join(FileConversionAssociation, FileConversionAssociation.conversion_id == Conversion.id). \
+        join(MotionCaptureData, MotionCaptureData.id == FileConversionAssociation.trc_id). \
+        filter(MotionCaptureData.hash == hash_). \
+        order_by(FileConversionAssociation.id). \
+        first()
 
     return conversion
 
 
-def markers(hash_):
+@_cached_query(Conversion.__tablename__)
+def landmarks_for_conversion(name):
+    """
+    Get the landmarks of the first conversion called name, as a dict of marker map target to source.
+    """
+    first_conversion_id = db_session.query(func.min(Conversion.id)).filter(Conversion.name == name).as_scalar()
+    result = db_session.query(MarkerMap.target, MarkerMap.source). \
+        join(ConversionMarkerMapAssociation, ConversionMarkerMapAssociation.marker_map_id == MarkerMap.id). \
+        filter(ConversionMarkerMapAssociation.conversion_id == first_conversion_id). \
+        order_by(ConversionMarkerMapAssociation.position)
+
+    return {r.target: r.source for r in result}
+
+
+@_cached_query()
+def _markers(hash_):
     query_result = MotionCaptureMetaData.query. \
         with_entities(MotionCaptureMetaData.markers). \
         filter(MotionCaptureMetaData.hash == hash_). \
         first()
-    markers_data = query_result[0].split('<sep>')
-    return markers_data
+    return tuple(query_result[0].split('<sep>'))
+
+
+def markers(hash_):
+    return list(_markers(hash_))
 
 
+@_cached_query(Demographic.__tablename__)
 def demographic(id_):
-    return db_session.query(Demographic).filter(Demographic.demographic_id == id_).scalar()
+    demographic_ = db_session.query(Demographic).filter(Demographic.demographic_id == id_).scalar()
+    if demographic_ is not None:
+        db_session.expunge(demographic_)
+    return demographic_
+
+
+def trajectories(hash_):
+    query_result = db_session.query(MotionCaptureTrajectory.label, MotionCaptureTrajectory.data). \
+        join(MotionCaptureData, MotionCaptureData.id == MotionCaptureTrajectory.trc_id). \
+        filter(MotionCaptureData.hash == hash_). \
+        order_by(MotionCaptureTrajectory.position). \
+        all()
+    return query_result
+
+
+class PageKeyError(ValueError):
+    pass
+
+
+def _prefix_range(column, prefix):
+    # A range rather than LIKE, so that the index on column is used whatever the collation.
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def _after(key_columns, key):
+    # Keyset condition for rows ordered by key_columns that come after key.
+    first_column, first_value = key_columns[0], key[0]
+    if len(key_columns) == 1:
+        return first_column > first_value
+
+    return and_(first_column >= first_value,
+                or_(first_column > first_value, _after(key_columns[1:], key[1:])))
+
+
+def _page(query, key_columns, after, limit):
+    """
+    Get a page of the rows of query ordered by key_columns, starting after the row with key after.
+
+    :param query: The query to page through.
+    :param key_columns: Columns that uniquely order the rows, the last one the primary key.
+    :param after: Key, a list of values for key_columns, of the last row of the previous page or None for the first page.
+    :param limit: Maximum number of rows in the page or None for all rows.
+    :return: Tuple of the rows and the key of the last row if there may be more rows, otherwise None.
+    :raises PageKeyError: If after is not a key for key_columns.
+    """
+    if after is not None:
+        if len(after) != len(key_columns) or not all(isinstance(value, (int, str)) for value in after):
+            raise PageKeyError(f"Invalid page key: {after}")
+        query = query.filter(_after(key_columns, after))
+    query = query.order_by(*key_columns)
+    if limit is None:
+        return query.all(), None
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, [getattr(rows[-1], column.key) for column in key_columns]
+
+
+def motion_capture_data_page(after=None, limit=None, prefix=None, count=False):
+    """
+    Get a page of the motion capture data, ordered by id, or by title then id if filtered by a title prefix.
+
+    :return: Tuple of rows with id, title and hash, the key to get the next page after or None,
+     and the number of matching rows if count else None.
+    """
+    query = db_session.query(MotionCaptureData.id, MotionCaptureData.title, MotionCaptureData.hash)
+    key_columns = [MotionCaptureData.id]
+    if prefix:
+        query = query.filter(_prefix_range(MotionCaptureData.title, prefix))
+        key_columns = [MotionCaptureData.title, MotionCaptureData.id]
+
+    total = query.count() if count else None
+    rows, next_key = _page(query, key_columns, after, limit)
+    return rows, next_key, total
+
+
+def public_demographics_page(after=None, limit=None, prefix=None, count=False):
+    """
+    Get a page of the public demographics, ordered by id, or by demographic id then id if filtered
+    by a demographic id prefix.
+
+    :return: Tuple of rows with id and demographic_id, the key to get the next page after or None,
+     and the number of matching rows if count else None.
+    """
+    query = db_session.query(Demographic.id, Demographic.demographic_id).filter(Demographic.public == true())
+    key_columns = [Demographic.id]
+    if prefix:
+        query = query.filter(_prefix_range(Demographic.demographic_id, prefix))
+        key_columns = [Demographic.demographic_id, Demographic.id]
+
+    total = query.count() if count else None
+    rows, next_key = _page(query, key_columns, after, limit)
+    return rows, next_key, total
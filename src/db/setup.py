@@ -4,13 +4,23 @@ from db.prepare import Base
 from db.common import engine
 
 
+def schema_exists():
+    """
+    Determine if the database schema has been created, by inspecting the database.
+    """
+    with engine.connect() as connection:
+        return engine.dialect.has_table(connection, "motion_capture_data")
+
+
 def init_db():
     import db.tables
+    from db.generations import bump_generations
 
     Base.metadata.create_all(bind=engine)
 
     session = sessionmaker(bind=engine)()
     v = db.tables.Version(db.tables.__version__)
     session.add(v)
+    bump_generations(session, Base.metadata.tables)
     session.commit()
     # print('Initialised database: ', engine.table_names())
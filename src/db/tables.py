@@ -1,17 +1,21 @@
-from sqlalchemy import Column, Integer, String, Float, Enum, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, Enum, ForeignKey, Boolean, LargeBinary, Index, Text
 from sqlalchemy.orm import relationship, backref
 
 from db.common import GenderEnum
 from db.prepare import Base
 
-__version__ = "0.1.0"
+__version__ = "0.15.0"
 
 
 class Demographic(Base):
     __tablename__ = "demographics"
+    # Added in version 0.5.0, public demographic id index added in version 0.7.0
+    __table_args__ = (Index('ix_demographics_demographic_id', 'demographic_id'),
+                      Index('ix_demographics_public_id', 'public', 'id'),
+                      Index('ix_demographics_public_demographic_id', 'public', 'demographic_id', 'id'))
 
     id = Column(Integer, primary_key=True)
-    demographic_id = Column(String)
+    demographic_id = Column(String(255))
     height = Column(Float)
     weight = Column(Float)
     age = Column(Float)
@@ -35,10 +39,13 @@ class Demographic(Base):
 class MotionCaptureData(Base):
     """"""
     __tablename__ = "motion_capture_data"
+    # Added in version 0.4.0, title index added in version 0.5.0
+    __table_args__ = (Index('ix_motion_capture_data_hash', 'hash', unique=True),
+                      Index('ix_motion_capture_data_title', 'title'))
 
     id = Column(Integer, primary_key=True)
-    title = Column(String)
-    hash = Column(String)
+    title = Column(String(255))
+    hash = Column(String(64))
 
     demographic_id = Column(Integer, ForeignKey("demographics.id"))
     demographic = relationship("Demographic", backref=backref(
@@ -56,21 +63,23 @@ class MotionCaptureData(Base):
 class MotionCaptureMetaData(Base):
     """"""
     __tablename__ = "motion_capture_meta_data"
+    # Added in version 0.5.0
+    __table_args__ = (Index('ix_motion_capture_meta_data_hash', 'hash', unique=True),)
 
     id = Column(Integer, primary_key=True)
-    hash = Column(String)
-    path_file_type = Column(String)
-    data_format = Column(String)
-    original_file_name = Column(String)
+    hash = Column(String(64))
+    path_file_type = Column(String(255))
+    data_format = Column(String(255))
+    original_file_name = Column(String(255))
     data_rate = Column(Float)
     camera_rate = Column(Float)
     num_frames = Column(Integer)
     num_markers = Column(Integer)
-    units = Column(String)
+    units = Column(String(32))
     orig_data_rate = Column(Float)
     orig_data_start_frame = Column(Integer)
     orig_num_frames = Column(Integer)
-    markers = Column(String)
+    markers = Column(Text)
 
     def __init__(self, hash_, path_file_type, data_format, original_file_name,
                  data_rate=-1.0, camera_rate=-1.0, num_frames=-1, num_markers=-1, units='',
@@ -116,7 +125,7 @@ class Version(Base):
     __tablename__ = "versions"
 
     id = Column(Integer, primary_key=True)
-    version = Column(String)
+    version = Column(String(32))
 
     def __init__(self, version):
         self.version = version
@@ -127,10 +136,12 @@ class Version(Base):
 
 class MarkerMap(Base):
     __tablename__ = "marker_map"
+    # Added in version 0.5.0
+    __table_args__ = (Index('ix_marker_map_source_target', 'source', 'target', unique=True),)
 
     id = Column(Integer, primary_key=True)
-    source = Column(String)
-    target = Column(String)
+    source = Column(String(255))
+    target = Column(String(255))
 
     def __init__(self, source, target):
         """"""
@@ -143,10 +154,13 @@ class MarkerMap(Base):
 
 class Conversion(Base):
     __tablename__ = "conversions"
+    # Added in version 0.5.0
+    __table_args__ = (Index('ix_conversions_name_marker_map_ids', 'name', 'marker_map_ids', unique=True),)
 
     id = Column(Integer, primary_key=True)
-    name = Column(String)
-    marker_map_ids = Column(String)
+    name = Column(String(255))
+    # MySQL limits the length of an indexed column, other databases do not need a limit.
+    marker_map_ids = Column(Text().with_variant(String(512), 'mysql'))
 
     def __init__(self, name, marker_map_ids):
         """"""
@@ -159,6 +173,8 @@ class Conversion(Base):
 
 class FileConversionAssociation(Base):
     __tablename__ = "file_conversion_associations"
+    # Added in version 0.5.0
+    __table_args__ = (Index('ix_file_conversion_associations_trc_id_conversion_id', 'trc_id', 'conversion_id', unique=True),)
 
     id = Column(Integer, primary_key=True)
     conversion_id = Column(Integer, ForeignKey("conversions.id"))
@@ -171,3 +187,149 @@ class FileConversionAssociation(Base):
 
     def __repr__(self):
         return f"<File Conversion Association: '{self.conversion_id}' - '{self.trc_id}'>"
+
+
+# Added in version 0.3.0
+class MotionCaptureTrajectory(Base):
+    __tablename__ = "motion_capture_trajectories"
+    __table_args__ = (Index('ix_motion_capture_trajectories_trc_id_position', 'trc_id', 'position', unique=True),)
+
+    id = Column(Integer, primary_key=True)
+    trc_id = Column(Integer, ForeignKey("motion_capture_data.id"), nullable=False)
+    position = Column(Integer, nullable=False)
+    label = Column(String(255))
+    # Length given so that MySQL uses a LONGBLOB.
+    data = Column(LargeBinary(2 ** 32 - 1))
+
+    def __init__(self, trc_id, position, label, data):
+        """"""
+        self.trc_id = trc_id
+        self.position = position
+        self.label = label
+        self.data = data
+
+    def __repr__(self):
+        return f"<Motion Capture Trajectory: '{self.trc_id}' - '{self.position}' - '{self.label}'>"
+
+
+# Added in version 0.6.0
+class ConversionMarkerMapAssociation(Base):
+    __tablename__ = "conversion_marker_map_associations"
+    __table_args__ = (Index('ix_conversion_marker_map_associations_conversion_id_position',
+                            'conversion_id', 'position', unique=True),)
+
+    id = Column(Integer, primary_key=True)
+    conversion_id = Column(Integer, ForeignKey("conversions.id"), nullable=False)
+    marker_map_id = Column(Integer, ForeignKey("marker_map.id"), nullable=False)
+    position = Column(Integer, nullable=False)
+
+    def __init__(self, conversion_id, marker_map_id, position):
+        """"""
+        self.conversion_id = conversion_id
+        self.marker_map_id = marker_map_id
+        self.position = position
+
+    def __repr__(self):
+        return f"<Conversion Marker Map Association: '{self.conversion_id}' - '{self.marker_map_id}' - '{self.position}'>"
+
+
+# Added in version 0.8.0
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (Index('ix_jobs_state_queued_at', 'state', 'queued_at'),
+                      # Added in version 0.10.0
+                      Index('ix_jobs_fingerprint', 'fingerprint'),
+                      # Added in version 0.11.0
+                      Index('ix_jobs_state_priority_due_at', 'state', 'priority', 'due_at'))
+
+    id = Column(String(36), primary_key=True)
+    state = Column(String(16), nullable=False)
+    source_pid = Column(Integer)
+    payload = Column(Text, nullable=False)
+    queued_at = Column(Float, nullable=False)
+    # Added in version 0.10.0
+    fingerprint = Column(String(64))
+    # Added in version 0.11.0
+    priority = Column(Integer)
+    submitter = Column(String(255))
+    # Not used since version 0.15.0, submitters take turns when jobs are claimed, see JobSubmitter.
+    due_at = Column(Float)
+    # Added in version 0.14.0
+    submissions = Column(Integer)
+
+    def __init__(self, id_, state, source_pid, payload, queued_at, fingerprint=None, priority=0, submitter=None,
+                 due_at=None, submissions=1):
+        """"""
+        self.id = id_
+        self.state = state
+        self.source_pid = source_pid
+        self.payload = payload
+        self.queued_at = queued_at
+        self.fingerprint = fingerprint
+        self.priority = priority
+        self.submitter = submitter
+        self.due_at = queued_at if due_at is None else due_at
+        self.submissions = submissions
+
+    def __repr__(self):
+        return f"<Job: '{self.id}' - '{self.state}'>"
+
+
+# Added in version 0.9.0
+class JobArchive(Base):
+    __tablename__ = "job_archive"
+    __table_args__ = (Index('ix_job_archive_archived_at', 'archived_at'),)
+
+    id = Column(String(36), primary_key=True)
+    state = Column(String(16), nullable=False)
+    source_pid = Column(Integer)
+    payload = Column(Text, nullable=False)
+    queued_at = Column(Float, nullable=False)
+    archived_at = Column(Float, nullable=False)
+    # Added in version 0.14.0
+    submissions = Column(Integer)
+
+    def __init__(self, id_, state, source_pid, payload, queued_at, archived_at, submissions=1):
+        """"""
+        self.id = id_
+        self.state = state
+        self.source_pid = source_pid
+        self.payload = payload
+        self.queued_at = queued_at
+        self.archived_at = archived_at
+        self.submissions = submissions
+
+    def __repr__(self):
+        return f"<Job Archive: '{self.id}' - '{self.state}'>"
+
+
+# Added in version 0.13.0
+class Generation(Base):
+    __tablename__ = "generations"
+
+    name = Column(String(64), primary_key=True)
+    token = Column(String(32), nullable=False)
+
+    def __init__(self, name, token):
+        """"""
+        self.name = name
+        self.token = token
+
+    def __repr__(self):
+        return f"<Generation: '{self.name}' - '{self.token}'>"
+
+
+# Added in version 0.15.0
+class JobSubmitter(Base):
+    __tablename__ = "job_submitters"
+
+    submitter = Column(String(255), primary_key=True)
+    served_at = Column(Float, nullable=False)
+
+    def __init__(self, submitter, served_at):
+        """"""
+        self.submitter = submitter
+        self.served_at = served_at
+
+    def __repr__(self):
+        return f"<Job Submitter: '{self.submitter}' - '{self.served_at}'>"
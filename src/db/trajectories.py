@@ -0,0 +1,99 @@
+import numpy as np
+
+from db.tables import MotionCaptureTrajectory
+
+FRAME_LABEL = 'Frame#'
+TIME_LABEL = 'Time'
+
+FRAME_DTYPE = np.dtype('<i8')
+COORDINATE_DTYPE = np.dtype('<f8')
+
+COORDINATE_COUNT = 3
+
+_STORE_BATCH_SIZE = 16 * 1024 ** 2
+
+
+def encode_trajectory(values, dtype=COORDINATE_DTYPE):
+    """
+    Pack a sequence of values, or a sequence of coordinates, into bytes.
+
+    :param values: Values to pack, anything numpy can convert to an array.
+    :param dtype: The numpy data type to store the values as.
+    :return: The packed bytes.
+    """
+    return np.ascontiguousarray(values, dtype=dtype).tobytes()
+
+
+def decode_trajectory(blob, dtype=COORDINATE_DTYPE, width=COORDINATE_COUNT):
+    """
+    Unpack bytes created with encode_trajectory into a read-only numpy array.
+
+    :param blob: The packed bytes.
+    :param dtype: The numpy data type the values were stored as.
+    :param width: The number of values per row, None for a flat array.
+    :return: The unpacked numpy array.
+    """
+    values = np.frombuffer(blob, dtype=dtype)
+    if width is None:
+        return values
+
+    return values.reshape(-1, width)
+
+
+def trajectory_channels(frames, times, marker_trajectories):
+    """
+    Pack the trajectories of one motion capture file into channels.
+    Each channel is one of: the frame numbers, the times, or a marker trajectory.
+
+    :param frames: The frame numbers.
+    :param times: The time for each frame.
+    :param marker_trajectories: Iterable of (marker, coordinates) pairs in marker order.
+    :return: Generator of (label, bytes) pairs.
+    """
+    yield FRAME_LABEL, encode_trajectory(frames, FRAME_DTYPE)
+    yield TIME_LABEL, encode_trajectory(times)
+    for marker, coordinates in marker_trajectories:
+        yield marker, encode_trajectory(coordinates)
+
+
+def store_trajectories(session, trc_id, channels, batch_size=_STORE_BATCH_SIZE):
+    """
+    Insert trajectory channels for a motion capture file using the given session.
+    Channels are consumed and inserted in batches, with an executemany for each batch,
+    so that no more than about batch_size bytes of channel data are held at once.
+
+    :param session: The session, or connection, to execute the inserts with.
+    :param trc_id: The id of the motion capture data the trajectories belong to.
+    :param channels: Iterable of (label, bytes) pairs, see trajectory_channels.
+    :param batch_size: Approximate number of bytes of channel data to insert at a time.
+    """
+    rows = []
+    rows_size = 0
+    for position, (label, data) in enumerate(channels):
+        rows.append({'trc_id': trc_id, 'position': position, 'label': label, 'data': data})
+        rows_size += len(data)
+        if rows_size >= batch_size:
+            session.execute(MotionCaptureTrajectory.__table__.insert(), rows)
+            rows = []
+            rows_size = 0
+
+    if rows:
+        session.execute(MotionCaptureTrajectory.__table__.insert(), rows)
+
+
+def trajectory_matrix(rows):
+    """
+    Decode motion capture trajectory rows, ordered by position, into numpy arrays.
+    All the marker trajectories are joined and decoded at once.
+
+    :param rows: The rows with label and data attributes, frame numbers first then times then markers.
+    :return: Tuple of frame numbers (N), times (N), marker labels (M), and coordinates (N x M x 3).
+    """
+    frames = decode_trajectory(rows[0].data, FRAME_DTYPE, None)
+    times = decode_trajectory(rows[1].data, width=None)
+    marker_rows = rows[2:]
+    labels = [row.label for row in marker_rows]
+    coordinates = np.frombuffer(b''.join([row.data for row in marker_rows]), dtype=COORDINATE_DTYPE)
+    coordinates = coordinates.reshape(len(labels), len(frames), COORDINATE_COUNT).transpose(1, 0, 2)
+
+    return frames, times, labels, coordinates
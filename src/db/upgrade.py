@@ -1,17 +1,32 @@
+import re
 import sys
+import json
+import time
 import inspect
 
 from natsort import natsorted
 from packaging import version
 
+from sqlalchemy import Table, Column, Integer, String, LargeBinary, MetaData, Index, text, func, select
+
+from config import Config
+
 from db.common import engine
+from db.generations import bump_generations
 from db.prepare import db_session, Base
-from db.tables import __version__, Version, MarkerMap, Conversion, FileConversionAssociation
+from db.tables import __version__, Version, MarkerMap, Conversion, FileConversionAssociation, MotionCaptureData, \
+    MotionCaptureTrajectory, DemographicMotionCaptureData, MotionCaptureMetaData, Demographic, \
+    ConversionMarkerMapAssociation, Job, JobArchive, Generation, JobSubmitter
+from db.trajectories import trajectory_channels
+
+_HASH_TABLE_NAME = re.compile('[0-9a-f]{64}')
 
 
 def _get_version():
     current_version = "0.0.0"
-    if engine.dialect.has_table(engine.connect(), "versions"):
+    with engine.connect() as connection:
+        has_versions = engine.dialect.has_table(connection, "versions")
+    if has_versions:
         entry = db_session.query(Version).order_by(Version.id.desc()).first()
         current_version = entry.version
 
@@ -35,6 +50,250 @@ def _upgrade_to_0_1_0():
     FileConversionAssociation.__table__.create(engine, checkfirst=True)
 
 
+def _quote(name):
+    return engine.dialect.identifier_preparer.quote(name)
+
+
+def _hash_table_names(column):
+    names = []
+    for name in engine.table_names():
+        if _HASH_TABLE_NAME.fullmatch(name):
+            with engine.connect() as connection:
+                columns = [c['name'] for c in engine.dialect.get_columns(connection, name)]
+            if column in columns:
+                names.append(name)
+
+    return names
+
+
+def _hash_trajectory_table(name):
+    # Per file trajectory table used by version 0.2.0.
+    return Table(name, MetaData(),
+                 Column('id', Integer, primary_key=True),
+                 Column('label', String),
+                 Column('data', LargeBinary))
+
+
+def _upgrade_to_0_2_0():
+    print('Upgrading to 0.2.0')
+    # Convert the '<sep>' joined text columns of each motion capture table into packed binary trajectories.
+    for name in _hash_table_names('Frame#'):
+        with engine.begin() as connection:
+            result = connection.execute(f'SELECT * FROM {_quote(name)} ORDER BY {_quote("index")}')
+            markers = [key for key in result.keys() if key not in ('index', 'Frame#', 'Time')]
+            rows = result.fetchall()
+            frames = [row['Frame#'] for row in rows]
+            times = [row['Time'] for row in rows]
+            marker_trajectories = [(marker, [[float(p) for p in row[marker].split('<sep>')] for row in rows])
+                                   for marker in markers]
+
+            connection.execute(f'DROP TABLE {_quote(name)}')
+            table_ = _hash_trajectory_table(name)
+            table_.create(connection)
+            connection.execute(table_.insert(), [{'label': label, 'data': data} for label, data in
+                                                 trajectory_channels(frames, times, marker_trajectories)])
+
+
+def _upgrade_to_0_3_0():
+    print('Upgrading to 0.3.0')
+    # Move the per file trajectory tables into the single motion capture trajectories table.
+    MotionCaptureTrajectory.__table__.create(engine, checkfirst=True)
+    hash_table_names = _hash_table_names('label')
+    with engine.begin() as connection:
+        trc_ids = dict(connection.execute(MotionCaptureData.__table__.select().
+                                          with_only_columns([MotionCaptureData.hash, MotionCaptureData.id]).
+                                          where(MotionCaptureData.hash.in_(hash_table_names))).fetchall())
+        for name in hash_table_names:
+            if name in trc_ids:
+                connection.execute(text(f'INSERT INTO motion_capture_trajectories (trc_id, position, label, data) '
+                                        f'SELECT :trc_id, id - 1, label, data FROM {_quote(name)} ORDER BY id'),
+                                   trc_id=trc_ids[name])
+                connection.execute(f'DROP TABLE {_quote(name)}')
+
+
+def _upgrade_to_0_4_0():
+    print('Upgrading to 0.4.0')
+    # Merge any motion capture data rows sharing a hash into one row, then make the hash unique.
+    data = MotionCaptureData.__table__
+    trajectory = MotionCaptureTrajectory.__table__
+    with engine.begin() as connection:
+        duplicate_hashes = [row.hash for row in connection.execute(data.select().with_only_columns([data.c.hash]).
+                                                                   group_by(data.c.hash).
+                                                                   having(func.count(data.c.id) > 1))]
+        for hash_ in duplicate_hashes:
+            ids = [row.id for row in connection.execute(data.select().with_only_columns([data.c.id]).
+                                                        where(data.c.hash == hash_).order_by(data.c.id))]
+            stored_ids = {row.trc_id for row in connection.execute(trajectory.select().distinct().
+                                                                   with_only_columns([trajectory.c.trc_id]).
+                                                                   where(trajectory.c.trc_id.in_(ids)))}
+            keep_id = next((id_ for id_ in ids if id_ in stored_ids), ids[0])
+            duplicate_ids = [id_ for id_ in ids if id_ != keep_id]
+            for association in [FileConversionAssociation.__table__, DemographicMotionCaptureData.__table__]:
+                connection.execute(association.update().where(association.c.trc_id.in_(duplicate_ids)).
+                                   values(trc_id=keep_id))
+            connection.execute(trajectory.delete().where(trajectory.c.trc_id.in_(duplicate_ids)))
+            connection.execute(data.delete().where(data.c.id.in_(duplicate_ids)))
+
+        Index('ix_motion_capture_data_hash', data.c.hash, unique=True).create(connection)
+
+
+def _has_duplicates(connection, columns):
+    return connection.execute(select(columns).group_by(*columns).having(func.count() > 1).limit(1)).first() is not None
+
+
+def _delete_duplicates(connection, table_, columns):
+    # Keep the first row of each set of duplicates.
+    first_ids = select([func.min(table_.c.id)]).group_by(*columns)
+    connection.execute(table_.delete().where(table_.c.id.notin_(first_ids)))
+
+
+def _create_missing_indexes(connection, table_):
+    existing_index_names = {index['name'] for index in engine.dialect.get_indexes(connection, table_.name)}
+    for index in list(table_.indexes):
+        if index.name in existing_index_names:
+            continue
+        if index.unique and _has_duplicates(connection, list(index.columns)):
+            print(f'Duplicate rows found, creating non-unique index {index.name}')
+            non_unique_index = Index(index.name, *index.columns)
+            non_unique_index.create(connection)
+            # Creating the index added it to the table definition, remove it again.
+            table_.indexes.discard(non_unique_index)
+        else:
+            index.create(connection)
+
+
+def _add_missing_columns(connection, table_):
+    existing_column_names = {column['name'] for column in engine.dialect.get_columns(connection, table_.name)}
+    for column in table_.columns:
+        if column.name not in existing_column_names:
+            connection.execute(f'ALTER TABLE {_quote(table_.name)} '
+                               f'ADD COLUMN {_quote(column.name)} {column.type.compile(engine.dialect)}')
+
+
+def _upgrade_to_0_5_0():
+    print('Upgrading to 0.5.0')
+    # Index the columns used for lookups, with unique indexes where the code already assumes uniqueness.
+    with engine.begin() as connection:
+        meta_data = MotionCaptureMetaData.__table__
+        _delete_duplicates(connection, meta_data, [meta_data.c.hash])
+        association = FileConversionAssociation.__table__
+        _delete_duplicates(connection, association, [association.c.trc_id, association.c.conversion_id])
+        for table_ in [Demographic.__table__, MotionCaptureData.__table__, meta_data,
+                       MarkerMap.__table__, Conversion.__table__, association]:
+            _create_missing_indexes(connection, table_)
+
+
+def _upgrade_to_0_6_0():
+    print('Upgrading to 0.6.0')
+    # Normalise the comma joined marker map ids of each conversion into association rows.
+    association = ConversionMarkerMapAssociation.__table__
+    conversion = Conversion.__table__
+    with engine.begin() as connection:
+        association.create(connection, checkfirst=True)
+        rows = []
+        for conversion_id, marker_map_ids in connection.execute(select([conversion.c.id, conversion.c.marker_map_ids])):
+            rows.extend([{'conversion_id': conversion_id, 'marker_map_id': int(marker_map_id), 'position': position}
+                         for position, marker_map_id in enumerate(marker_map_ids.split(',')) if marker_map_id])
+        if rows:
+            connection.execute(association.insert(), rows)
+
+
+def _upgrade_to_0_7_0():
+    print('Upgrading to 0.7.0')
+    # Index the public demographics by id for prefix filtered pages.
+    with engine.begin() as connection:
+        _create_missing_indexes(connection, Demographic.__table__)
+
+
+def _upgrade_to_0_8_0():
+    print('Upgrading to 0.8.0')
+    # Jobs are kept in the database, carry over the jobs in the legacy queue file when using the database queue.
+    from process.queue_json import JsonJobQueue
+
+    jobs = Job.__table__
+    with engine.begin() as connection:
+        jobs.create(connection, checkfirst=True)
+        if Config.JOB_QUEUE_BACKEND == 'sql':
+            queued_at = time.time()
+            rows = [{'id': entry['id'], 'state': entry['state'], 'source_pid': entry['source_pid'],
+                     'payload': json.dumps(entry['payload']), 'queued_at': queued_at + position * 1e-6}
+                    for position, entry in enumerate(JsonJobQueue().jobs())]
+            if rows:
+                connection.execute(jobs.insert(), rows)
+
+
+def _upgrade_to_0_9_0():
+    print('Upgrading to 0.9.0')
+    with engine.begin() as connection:
+        JobArchive.__table__.create(connection, checkfirst=True)
+
+
+def _upgrade_to_0_10_0():
+    print('Upgrading to 0.10.0')
+    # Jobs record the fingerprint of their configuration, to find identical jobs.
+    with engine.begin() as connection:
+        _add_missing_columns(connection, Job.__table__)
+        _create_missing_indexes(connection, Job.__table__)
+
+
+def _upgrade_to_0_11_0():
+    print('Upgrading to 0.11.0')
+    # Jobs are scheduled by priority and submitter, existing jobs keep their order.
+    jobs = Job.__table__
+    with engine.begin() as connection:
+        _add_missing_columns(connection, jobs)
+        _create_missing_indexes(connection, jobs)
+        connection.execute(jobs.update().where(jobs.c.priority.is_(None)).values(priority=0))
+        connection.execute(jobs.update().where(jobs.c.due_at.is_(None)).values(due_at=jobs.c.queued_at))
+
+
+def _set_string_lengths(connection, table_):
+    # Only the column types of PostgreSQL databases need changing, SQLite ignores the length of a string and
+    # MySQL databases could not be created without lengths.
+    existing_types = {column['name']: column['type'] for column in engine.dialect.get_columns(connection, table_.name)}
+    for column in table_.columns:
+        type_ = column.type.dialect_impl(engine.dialect)
+        if isinstance(type_, String) and column.name in existing_types and \
+                getattr(existing_types[column.name], 'length', None) != type_.length:
+            connection.execute(f'ALTER TABLE {_quote(table_.name)} '
+                               f'ALTER COLUMN {_quote(column.name)} TYPE {type_.compile(engine.dialect)}')
+
+
+def _upgrade_to_0_12_0():
+    print('Upgrading to 0.12.0')
+    # String columns have lengths, so that the schema can be created on every database.
+    if engine.dialect.name != 'postgresql':
+        return
+
+    with engine.begin() as connection:
+        for table_ in [Demographic.__table__, MotionCaptureData.__table__, MotionCaptureMetaData.__table__,
+                       Version.__table__, MarkerMap.__table__, Conversion.__table__, MotionCaptureTrajectory.__table__]:
+            _set_string_lengths(connection, table_)
+
+
+def _upgrade_to_0_13_0():
+    print('Upgrading to 0.13.0')
+    # Table generations are kept in the database, so that every node sharing it sees them.
+    with engine.begin() as connection:
+        Generation.__table__.create(connection, checkfirst=True)
+
+
+def _upgrade_to_0_14_0():
+    print('Upgrading to 0.14.0')
+    # Jobs count the identical submissions sharing them, existing jobs have one.
+    with engine.begin() as connection:
+        for table_ in (Job.__table__, JobArchive.__table__):
+            _add_missing_columns(connection, table_)
+            connection.execute(table_.update().where(table_.c.submissions.is_(None)).values(submissions=1))
+
+
+def _upgrade_to_0_15_0():
+    print('Upgrading to 0.15.0')
+    # Submitters take turns when jobs are claimed, by the time each was last served.
+    with engine.begin() as connection:
+        JobSubmitter.__table__.create(connection, checkfirst=True)
+
+
 def _upgrades_available():
     return [name for name, obj in inspect.getmembers(sys.modules[__name__])
             if (inspect.isfunction(obj) and
@@ -59,6 +318,8 @@ def upgrade():
 
     v = Version(__version__)
     db_session.add(v)
+    # Data may have been rewritten, so every table starts a new generation.
+    bump_generations(db_session, Base.metadata.tables)
     db_session.commit()
 
     # print('Initialised database: ', engine.table_names())
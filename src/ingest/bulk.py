@@ -0,0 +1,158 @@
+import gzip
+import lzma
+import os
+import shutil
+import tarfile
+import uuid
+import zipfile
+import zlib
+
+from concurrent.futures import BrokenExecutor
+
+from config import Config
+
+from db.prepare import db_session
+from db.queries import existing_motion_capture_data_hashes
+
+from ingest.pool import ingest_executor
+from ingest.store import ingest_result, hash_file, parse_trc_file, store_parsed_trcs, CHUNK_SIZE
+
+_ZIP_EXTENSIONS = ('.zip',)
+_TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+# Errors reading a zip member that only fail that member: corrupt or truncated data, a bad CRC, encryption,
+# or an unsupported compression method.
+_INVALID_MEMBER_ERRORS = (zipfile.BadZipFile, zlib.error, EOFError, RuntimeError, NotImplementedError)
+# Errors reading an archive that fail the rest of it.
+_INVALID_ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, zlib.error, EOFError, gzip.BadGzipFile,
+                           lzma.LZMAError)
+
+
+def is_archive(file_name):
+    return file_name.lower().endswith(_ZIP_EXTENSIONS + _TAR_EXTENSIONS)
+
+
+def _spool_path(directory):
+    return os.path.join(directory, str(uuid.uuid4()))
+
+
+def spool_file(stream, directory):
+    path = _spool_path(directory)
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(stream, f, CHUNK_SIZE)
+
+    return path
+
+
+def spool_archive(file_name, stream, directory, accept):
+    """
+    Spool the files in a zip or tar archive to directory.
+    Only files whose base name is accepted are spooled. A member that cannot be read is left out and listed
+    without a spooled path, as is the archive itself if it cannot be read any further.
+
+    :param file_name: Name of the archive, the extension determines the archive type.
+    :param stream: Binary file like object to read the archive from.
+    :param directory: Directory to spool the files to.
+    :param accept: Callable taking a file name and returning True if the file should be spooled.
+    :return: List of (file name, spooled path) pairs, the path is None for a member or archive that cannot be read.
+    """
+    spooled = []
+    try:
+        if file_name.lower().endswith(_ZIP_EXTENSIONS):
+            with zipfile.ZipFile(stream) as archive:
+                for info in archive.infolist():
+                    member_name = os.path.basename(info.filename)
+                    if not info.is_dir() and accept(member_name):
+                        spooled.append((member_name, _spool_zip_member(archive, info, directory)))
+        else:
+            with tarfile.open(fileobj=stream, mode='r:*') as archive:
+                for info in archive:
+                    member_name = os.path.basename(info.name)
+                    if info.isfile() and accept(member_name):
+                        spooled.append((member_name, spool_file(archive.extractfile(info), directory)))
+    except _INVALID_ARCHIVE_ERRORS:
+        spooled.append((file_name, None))
+
+    return spooled
+
+
+def _spool_zip_member(archive, info, directory):
+    path = _spool_path(directory)
+    try:
+        with archive.open(info) as member, open(path, 'wb') as f:
+            shutil.copyfileobj(member, f, CHUNK_SIZE)
+    except _INVALID_MEMBER_ERRORS:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+
+    return path
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def ingest_files(files):
+    """
+    Ingest many spooled TRC files.
+    Files are hashed and checked against the database first, the remaining files are parsed in parallel
+    in the ingest process pool and then stored in batched transactions.
+
+    :param files: List of (file name, spooled path) pairs.
+    :return: List of ingest results in the same order as files.
+    """
+    try:
+        return _ingest_files(files)
+    except Exception:
+        # Leave the session clean for the next user of it.
+        db_session.rollback()
+        raise
+
+
+def _ingest_files(files):
+    executor = ingest_executor()
+    hashes = list(executor.map(hash_file, [path for _, path in files]))
+    existing_hashes = existing_motion_capture_data_hashes(set(hashes))
+
+    results = [None] * len(files)
+    first_index = {}
+    parse_futures = {}
+    for index, ((file_name, path), hash_) in enumerate(zip(files, hashes)):
+        if hash_ in existing_hashes:
+            results[index] = ingest_result(200, 'Content already exists in database.', file_name, hash_)
+        elif hash_ not in first_index:
+            first_index[hash_] = index
+            parse_futures[index] = executor.submit(parse_trc_file, path, path + '.rows')
+
+    parsed = []
+    for index, future in parse_futures.items():
+        file_name, path = files[index]
+        try:
+            header, row_count = future.result()
+        except BrokenExecutor:
+            raise
+        except Exception:
+            # Any other failure to parse a file only fails that file.
+            results[index] = ingest_result(400, 'Invalid file content', file_name)
+            continue
+        parsed.append({'index': index, 'file_name': file_name, 'file_hash': hashes[index],
+                       'header': header, 'row_count': row_count, 'rows_path': path + '.rows'})
+
+    for batch in _batches(parsed, Config.INGEST_BATCH_SIZE):
+        for p, result in zip(batch, store_parsed_trcs(batch)):
+            results[p['index']] = result
+
+    # Repeats of a file within the request share the outcome of its first occurrence.
+    for index, ((file_name, _), hash_) in enumerate(zip(files, hashes)):
+        if results[index] is None:
+            first_result = results[first_index[hash_]]
+            if first_result['status'] == 400:
+                results[index] = ingest_result(400, 'Invalid file content', file_name)
+            else:
+                results[index] = ingest_result(200, 'Content already exists in database.', file_name, hash_)
+
+    return results
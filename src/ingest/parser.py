@@ -0,0 +1,207 @@
+import numpy as np
+
+from db.trajectories import FRAME_LABEL, TIME_LABEL, FRAME_DTYPE, COORDINATE_DTYPE, COORDINATE_COUNT, \
+    encode_trajectory
+
+_HEADER_TYPE_MAP = {
+    'DataRate': float,
+    'CameraRate': float,
+    'NumFrames': int,
+    'NumMarkers': int,
+    'Units': str,
+    'OrigDataRate': float,
+    'OrigDataStartFrame': int,
+    'OrigNumFrames': int
+}
+
+_HEADER_LINE_COUNT = 5
+_BLOCK_ROWS = 4096
+
+
+class TRCFormatError(IOError):
+    pass
+
+
+def _row_width(header):
+    return 2 + header['NumMarkers'] * COORDINATE_COUNT
+
+
+def spooled_channels(spool, header, row_count):
+    """
+    Generate the packed trajectory channels from data rows spooled by a TRCStreamParser, one at a time.
+
+    :param spool: The spool file, a binary file object or the path to it.
+    :param header: The header the parser produced.
+    :param row_count: The number of rows the parser spooled.
+    :return: Generator of (label, bytes) pairs: frame numbers, times, then one per marker in marker order.
+    """
+    rows = np.memmap(spool, dtype=COORDINATE_DTYPE, mode='r', shape=(row_count, _row_width(header)))
+    yield FRAME_LABEL, encode_trajectory(rows[:, 0], FRAME_DTYPE)
+    yield TIME_LABEL, encode_trajectory(rows[:, 1])
+    for index, marker in enumerate(header['Markers']):
+        start = 2 + index * COORDINATE_COUNT
+        yield marker, encode_trajectory(rows[:, start:start + COORDINATE_COUNT])
+
+
+def _convert_to_number(value):
+    try:
+        number = float(value)
+    except ValueError:
+        number = float('nan')
+    return number
+
+
+class TRCStreamParser(object):
+    """
+    Parse TRC formatted motion capture data incrementally from chunks of bytes.
+
+    The header is kept in a dict like the one TRCData creates.
+    The data rows are packed into a spool file as rows of frame, time, and the marker coordinates,
+    a block of rows at a time, so the memory used does not depend on the size of the data.
+    """
+
+    def __init__(self, spool):
+        """
+        :param spool: Binary file object, opened for reading and writing, to pack the data rows into.
+        """
+        self._spool = spool
+        self._pending = b''
+        self._line_number = 0
+        self._header_lines = []
+        self._block = None
+        self._block_size = 0
+        self._row_count = 0
+        self._closed = False
+        self.header = {}
+
+    @property
+    def row_count(self):
+        return self._row_count
+
+    def feed(self, chunk):
+        lines = (self._pending + chunk).split(b'\n')
+        self._pending = lines.pop()
+        for line in lines:
+            self._process_line(line)
+
+    def close(self):
+        if self._pending:
+            self._process_line(self._pending)
+            self._pending = b''
+
+        if len(self._header_lines) < _HEADER_LINE_COUNT:
+            raise TRCFormatError(f"File ended unexpectedly at line {self._line_number} during header parsing.")
+
+        self._flush_block()
+        self._spool.flush()
+        if self._row_count == 0:
+            raise TRCFormatError("File ended without specifying any data.")
+
+        self._closed = True
+
+    def channels(self):
+        """
+        Generate the packed trajectory channels from the spooled data rows, one at a time.
+        Only valid after close.
+
+        :return: Generator of (label, bytes) pairs, see spooled_channels.
+        """
+        if not self._closed:
+            raise TRCFormatError("Cannot read channels before the parser is closed.")
+
+        return spooled_channels(self._spool, self.header, self._row_count)
+
+    def _row_width(self):
+        return _row_width(self.header)
+
+    def _process_line(self, line):
+        self._line_number += 1
+        if len(self._header_lines) < _HEADER_LINE_COUNT:
+            try:
+                self._header_lines.append(line.decode('utf-8'))
+            except UnicodeDecodeError:
+                raise TRCFormatError(f"File format invalid: Line {self._line_number} is not valid UTF-8.")
+            if len(self._header_lines) == _HEADER_LINE_COUNT:
+                self._process_header()
+        else:
+            self._process_data_line(line)
+
+    def _process_header(self):
+        sections = self._header_lines[0].split(maxsplit=3)
+        if len(sections) != 4:
+            raise TRCFormatError('File format invalid: Header line 1 does not have four space delimited sections.')
+        self.header[sections[0]] = sections[1]
+        self.header['DataFormat'] = sections[2]
+        self.header['FileName'] = sections[3]
+        data_format_count = len(sections[2].split('/'))
+        if data_format_count != COORDINATE_COUNT:
+            raise TRCFormatError(f'File format invalid: Data format "{sections[2]}" is not supported.')
+
+        header_keys = self._header_lines[1].split()
+        header_values = self._header_lines[2].split()
+        if len(header_keys) != len(header_values):
+            raise TRCFormatError(f'File format invalid: File header keys count ({len(header_keys)}) is not equal to'
+                                 f' file header data count ({len(header_values)})')
+
+        try:
+            for key, value in zip(header_keys, header_values):
+                self.header[key] = _HEADER_TYPE_MAP.get(key, float)(value)
+        except ValueError:
+            raise TRCFormatError('File format invalid: File header data has an invalid value.')
+
+        if 'NumMarkers' not in self.header:
+            raise TRCFormatError('File format invalid: File header does not specify NumMarkers.')
+
+        data_header_markers = self._header_lines[3].split()
+        if data_header_markers[:1] != ['Frame#']:
+            raise TRCFormatError('File format invalid: Data header does not start with "Frame#".')
+        if data_header_markers[1:2] != ['Time']:
+            raise TRCFormatError('File format invalid: Data header in position 2 is not "Time".')
+        self.header['Markers'] = data_header_markers[2:]
+
+        sub_marker_headers = self._header_lines[4].split()
+        if self.header['NumMarkers'] * data_format_count != len(sub_marker_headers) or \
+                self.header['NumMarkers'] != len(self.header['Markers']):
+            raise TRCFormatError(f'File format invalid: Data header marker count ({len(self.header["Markers"])})'
+                                 f' is not equal to data header sub-marker count ({len(sub_marker_headers)})')
+
+        self._block = np.empty((_BLOCK_ROWS, self._row_width()), dtype=COORDINATE_DTYPE)
+
+    def _process_data_line(self, line):
+        sections = line.split()
+        if len(sections) == 0:
+            return
+
+        try:
+            frame = int(sections[0])
+        except ValueError:
+            raise TRCFormatError(f"File format invalid: Invalid frame number at line {self._line_number}")
+        try:
+            time = float(sections[1])
+        except IndexError:
+            raise TRCFormatError(f"Missing time value at line {self._line_number}")
+        except ValueError:
+            raise TRCFormatError(f"Invalid time value at line {self._line_number}")
+
+        values = sections[2:]
+        row = self._block[self._block_size]
+        row[0] = frame
+        row[1] = time
+        row[2:] = np.nan
+        if len(values) % COORDINATE_COUNT != 0 and len(values) <= len(row) - 2:
+            raise TRCFormatError(f'File format invalid: Data frame {len(values)} does not match the data format')
+        elif len(values) <= len(row) - 2:
+            try:
+                row[2:2 + len(values)] = [float(value) for value in values]
+            except ValueError:
+                row[2:2 + len(values)] = [_convert_to_number(value) for value in values]
+
+        self._block_size += 1
+        if self._block_size == _BLOCK_ROWS:
+            self._flush_block()
+
+    def _flush_block(self):
+        if self._block_size:
+            self._spool.write(self._block[:self._block_size].tobytes())
+            self._row_count += self._block_size
+            self._block_size = 0
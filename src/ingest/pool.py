@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from concurrent.futures import ProcessPoolExecutor
+
+from config import Config
+
+from db.common import engine
+from db.prepare import db_session
+
+from ingest.store import ingest_trc, CHUNK_SIZE
+from process.job_controls import JobState
+
+_SPOOL_SUFFIX = ".trc"
+_STATUS_SUFFIX = ".json"
+# Seconds between looks for expired ingest files.
+_EXPIRY_INTERVAL = 60
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(Config.INGEST_MAX_PENDING)
+_last_expiry = 0.0
+
+
+def _spool_path(ingest_id):
+    return os.path.join(Config.INGEST_DIR, f"{ingest_id}{_SPOOL_SUFFIX}")
+
+
+def _status_path(ingest_id):
+    return os.path.join(Config.INGEST_DIR, f"{ingest_id}{_STATUS_SUFFIX}")
+
+
+def _write_status(ingest_id, state, file_name, result=None):
+    status = {'id': ingest_id, 'state': state, 'file_name': file_name, 'result': result}
+    staging_path = _status_path(ingest_id) + '.part'
+    with open(staging_path, 'w') as f:
+        json.dump(status, f)
+    os.replace(staging_path, _status_path(ingest_id))
+
+
+def _initialise_worker():
+    # Connections inherited from the parent process must not be shared.
+    engine.dispose()
+
+
+def ingest_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=Config.INGEST_WORKERS, initializer=_initialise_worker)
+
+    return _executor
+
+
+def _remove_spool(ingest_id):
+    try:
+        os.remove(_spool_path(ingest_id))
+    except FileNotFoundError:
+        pass
+
+
+def _run_ingest(ingest_id, file_name):
+    _write_status(ingest_id, JobState.RUNNING, file_name)
+    # The spool is removed before the final status is written, so a finished ingest has no spool file left.
+    try:
+        with open(_spool_path(ingest_id), 'rb') as f:
+            result = ingest_trc(file_name, f)
+        _remove_spool(ingest_id)
+        _write_status(ingest_id, JobState.FINISHED, file_name, result)
+    except Exception as e:
+        db_session.rollback()
+        _remove_spool(ingest_id)
+        _write_status(ingest_id, JobState.ERROR, file_name, {'status': 500, 'message': str(e), 'file_name': file_name})
+    finally:
+        db_session.remove()
+
+
+def expire_ingests(max_age=None):
+    """
+    Remove the status files, and any spool files left by ingests that never finished, older than max_age seconds.
+
+    :param max_age: Maximum age in seconds, Config.INGEST_STATUS_MAX_AGE by default.
+    :return: The number of files removed.
+    """
+    oldest = time.time() - (Config.INGEST_STATUS_MAX_AGE if max_age is None else max_age)
+    removed = 0
+    try:
+        entries = list(os.scandir(Config.INGEST_DIR))
+    except FileNotFoundError:
+        return 0
+
+    for entry in entries:
+        if not entry.name.endswith((_STATUS_SUFFIX, _SPOOL_SUFFIX, '.part')) or not entry.is_file():
+            continue
+        try:
+            if entry.stat().st_mtime < oldest:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+
+    return removed
+
+
+def _expire_ingests_periodically():
+    global _last_expiry
+    if time.time() - _last_expiry >= _EXPIRY_INTERVAL:
+        _last_expiry = time.time()
+        expire_ingests()
+
+
+def submit_ingest(file_name, stream):
+    """
+    Spool the content of stream to the ingest directory and queue it for ingesting in the ingest process pool.
+
+    :param file_name: The name of the uploaded file.
+    :param stream: Binary file like object to read the TRC content from.
+    :return: The ingest id or None if the maximum number of pending ingests has been reached.
+    """
+    _expire_ingests_periodically()
+    if not _pending.acquire(blocking=False):
+        return None
+
+    ingest_id = str(uuid.uuid4())
+    try:
+        os.makedirs(Config.INGEST_DIR, exist_ok=True)
+        with open(_spool_path(ingest_id), 'wb') as f:
+            shutil.copyfileobj(stream, f, CHUNK_SIZE)
+        _write_status(ingest_id, JobState.QUEUED, file_name)
+        future = ingest_executor().submit(_run_ingest, ingest_id, file_name)
+    except Exception:
+        _pending.release()
+        raise
+
+    future.add_done_callback(lambda _: _pending.release())
+    return ingest_id
+
+
+def ingest_status(ingest_id):
+    """
+    Get the status of an ingest, from any process.
+
+    :return: Status dict with keys id, state, file_name, and result, or None if the ingest id is not known.
+    """
+    try:
+        ingest_id = str(uuid.UUID(ingest_id))
+        with open(_status_path(ingest_id)) as f:
+            return json.load(f)
+    except (TypeError, ValueError, FileNotFoundError):
+        return None
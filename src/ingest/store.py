@@ -0,0 +1,233 @@
+import contextlib
+import fcntl
+import hashlib
+import os
+import tempfile
+
+from sqlalchemy.exc import IntegrityError, DataError
+
+from config import Config
+
+from db.generations import bump_generations
+from db.prepare import db_session
+from db.queries import motion_capture_data_exists, existing_motion_capture_data_hashes
+from db.tables import MotionCaptureData, MotionCaptureMetaData
+from db.trajectories import store_trajectories
+
+from ingest.parser import TRCStreamParser, TRCFormatError, spooled_channels
+
+CHUNK_SIZE = 1024 ** 2
+
+# Errors storing a parsed file that are caused by its content, e.g. a missing header entry or a value too long for its column.
+_INVALID_CONTENT_ERRORS = (KeyError, TypeError, ValueError, DataError)
+
+
+def ingest_result(status, message, file_name, file_hash=None):
+    result = {'status': status, 'message': message, 'file_name': file_name}
+    if file_hash is not None:
+        result['file_hash'] = file_hash
+
+    return result
+
+
+def _exists_result(file_name, readable_hash):
+    return ingest_result(200, 'Content already exists in database.', file_name, readable_hash)
+
+
+def _added_result(file_name, readable_hash):
+    return ingest_result(201, 'Content added to database.', file_name, readable_hash)
+
+
+def _invalid_result(file_name):
+    return ingest_result(400, 'Invalid file content', file_name)
+
+
+def _hash_stream(stream, copy_to=None, chunk_size=CHUNK_SIZE):
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        sha256.update(chunk)
+        if copy_to is not None:
+            copy_to.write(chunk)
+
+    return sha256.hexdigest()
+
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        return _hash_stream(f, chunk_size=chunk_size)
+
+
+def _parse_stream(stream, spool, chunk_size=CHUNK_SIZE):
+    parser = TRCStreamParser(spool)
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        parser.feed(chunk)
+    parser.close()
+
+    return parser
+
+
+@contextlib.contextmanager
+def _hash_lock(hash_):
+    """
+    Hold the lock on the ingest of content with hash_, for ingests in any process sharing Config.INGEST_DIR.
+    The lock file is removed when the lock is released, so lock files do not pile up. A waiter that then gets
+    the lock on the removed file starts again with a new one, so only one ingest holds the lock of a hash.
+    """
+    path = os.path.join(Config.INGEST_DIR, f"{hash_}.lock")
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_nlink:
+                break
+        except BaseException:
+            os.close(fd)
+            raise
+        os.close(fd)
+
+    try:
+        yield
+    finally:
+        os.remove(path)
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def _ingest_locks(hashes):
+    # Locks are always taken in sorted order so that concurrent ingests cannot deadlock.
+    os.makedirs(Config.INGEST_DIR, exist_ok=True)
+    with contextlib.ExitStack() as stack:
+        for hash_ in sorted(set(hashes)):
+            stack.enter_context(_hash_lock(hash_))
+        yield
+
+
+def ingest_trc(file_name, stream, chunk_size=CHUNK_SIZE):
+    """
+    Store TRC content read from stream in the database, if it is not already there.
+
+    The content is hashed first, a chunk at a time, and only parsed if the hash is not in the database.
+    Concurrent ingests of the same content, from any process, are serialised so that only the first parses
+    and stores the content, the others wait for it and report that the content already exists.
+
+    :param file_name: The name of the uploaded file.
+    :param stream: Binary file like object to read the TRC content from.
+    :param chunk_size: Number of bytes to read from the stream at a time.
+    :return: The ingest result dict, with keys status, message, file_name, and file_hash if valid.
+    """
+    if stream.seekable():
+        return _ingest_seekable(file_name, stream, chunk_size)
+
+    with tempfile.TemporaryFile() as content:
+        _hash_stream(stream, content, chunk_size)
+        content.seek(0)
+        return _ingest_seekable(file_name, content, chunk_size)
+
+
+def _ingest_seekable(file_name, stream, chunk_size):
+    start = stream.tell()
+    readable_hash = _hash_stream(stream, chunk_size=chunk_size)
+    if motion_capture_data_exists(readable_hash):
+        return _exists_result(file_name, readable_hash)
+
+    with _ingest_locks([readable_hash]):
+        # Another ingest of the same content may have finished while waiting for the lock.
+        db_session.rollback()
+        if motion_capture_data_exists(readable_hash):
+            return _exists_result(file_name, readable_hash)
+
+        stream.seek(start)
+        with tempfile.TemporaryFile() as spool:
+            try:
+                parser = _parse_stream(stream, spool, chunk_size)
+            except TRCFormatError:
+                return _invalid_result(file_name)
+
+            try:
+                _add(file_name, readable_hash, parser.header, parser.channels())
+                bump_generations(db_session, [MotionCaptureData.__tablename__])
+                db_session.commit()
+            except IntegrityError:
+                # Stored by an ingest not sharing the lock, e.g. on another host.
+                db_session.rollback()
+                return _exists_result(file_name, readable_hash)
+            except _INVALID_CONTENT_ERRORS:
+                db_session.rollback()
+                return _invalid_result(file_name)
+            except Exception:
+                db_session.rollback()
+                raise
+
+    return _added_result(file_name, readable_hash)
+
+
+def parse_trc_file(path, rows_path, chunk_size=CHUNK_SIZE):
+    """
+    Parse the TRC file at path, spooling its data rows to the file rows_path.
+
+    :return: Tuple of the TRC header and the number of data rows.
+    """
+    with open(path, 'rb') as f, open(rows_path, 'w+b') as spool:
+        parser = _parse_stream(f, spool, chunk_size)
+
+    return parser.header, parser.row_count
+
+
+def store_parsed_trcs(parsed):
+    """
+    Store parsed TRC files in the database in a single transaction, skipping any that already exist.
+    If the transaction fails on an existing hash or on the content of a file, each file is stored in its own
+    transaction instead, so that only the failing file is reported, as existing or as invalid content.
+
+    :param parsed: List of dicts with keys file_name, file_hash, header, row_count, and rows_path,
+     see parse_trc_file.
+    :return: List of ingest results in the same order as parsed.
+    """
+    with _ingest_locks([p['file_hash'] for p in parsed]):
+        db_session.rollback()
+        existing_hashes = existing_motion_capture_data_hashes([p['file_hash'] for p in parsed])
+        results = []
+        try:
+            for p in parsed:
+                if p['file_hash'] in existing_hashes:
+                    results.append(_exists_result(p['file_name'], p['file_hash']))
+                else:
+                    _add(p['file_name'], p['file_hash'], p['header'], spooled_channels(p['rows_path'], p['header'], p['row_count']))
+                    existing_hashes.add(p['file_hash'])
+                    results.append(_added_result(p['file_name'], p['file_hash']))
+
+            bump_generations(db_session, [MotionCaptureData.__tablename__])
+            db_session.commit()
+        except IntegrityError:
+            db_session.rollback()
+            if len(parsed) == 1:
+                return [_exists_result(parsed[0]['file_name'], parsed[0]['file_hash'])]
+            results = None
+        except _INVALID_CONTENT_ERRORS:
+            db_session.rollback()
+            if len(parsed) == 1:
+                return [_invalid_result(parsed[0]['file_name'])]
+            results = None
+        except Exception:
+            db_session.rollback()
+            raise
+
+    if results is None:
+        results = [store_parsed_trcs([p])[0] for p in parsed]
+
+    return results
+
+
+def _add(file_name, readable_hash, header, channels):
+    m = MotionCaptureData(file_name, readable_hash)
+    db_session.add(m)
+    db_session.flush()
+    store_trajectories(db_session, m.id, channels)
+    joined_markers = '<sep>'.join(header['Markers'])
+    md = MotionCaptureMetaData(readable_hash, header['PathFileType'], header['DataFormat'], header['FileName'],
+                               data_rate=header['DataRate'], camera_rate=header['CameraRate'],
+                               num_frames=header['NumFrames'], num_markers=header['NumMarkers'],
+                               units=header['Units'], orig_data_rate=header['OrigDataRate'],
+                               # orig_data_start_frame=header['OrigDataStartFrame'], orig_num_frames=header['OrigNumFrames'],
+                               markers=joined_markers)
+    db_session.add(md)
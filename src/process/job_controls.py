@@ -2,6 +2,9 @@
 
 QUEUE_FILE = "job_queue.json"
 QUEUE_LOCK_FILE = QUEUE_FILE + ".lock"
+ARCHIVE_FILE = "job_archive.jsonl"
+ARCHIVE_INDEX_FILE = "job_archive.index"
+SUBMITTERS_FILE = "job_submitters.json"
 
 
 class JobState(object):
@@ -10,3 +13,106 @@ class JobState(object):
     RUNNING = "running"
     FINISHED = "finished"
     ERROR = "error"
+
+
+class JobRemoval(object):
+
+    REMOVED = "removed"
+    # Only the caller's submission of a job shared by identical submissions was removed.
+    RELEASED = "released"
+
+
+class JobQueue(object):
+    """
+    Interface of a job queue backend.
+    A job is a dict with the keys payload, id, source_pid, state, fingerprint, priority, and submitter,
+    see job_manager.create_job. Queued jobs are claimed in the order given by the scheduler module.
+    A job also counts its submissions, identical submissions share the job, see share_active_job.
+    """
+
+    def send_job(self, job):
+        """
+        Queue the job.
+        """
+        raise NotImplementedError()
+
+    def receive_job(self):
+        """
+        Claim the next queued job chosen by the scheduler, see scheduler.next_job, marking it as running
+        and its submitter as served.
+
+        :return: The claimed job or None if no job is queued.
+        """
+        raise NotImplementedError()
+
+    def get_job_state(self, job_id):
+        """
+        :return: The state of the job, looked up in the queue then the archive, or "unknown".
+        """
+        raise NotImplementedError()
+
+    def share_active_job(self, fingerprint, priority):
+        """
+        Add a submission to a queued or running job with the fingerprint, raising its priority to priority
+        if that is higher.
+
+        :return: The id of the job, or None if there is none.
+        """
+        raise NotImplementedError()
+
+    def list_jobs(self):
+        """
+        :return: List of dicts with the id, state, priority, submitter, and queued_at of each job in the queue,
+         archived jobs are not listed.
+        """
+        raise NotImplementedError()
+
+    def served_times(self):
+        """
+        :return: Dict of the time each submitter last had a job claimed, see scheduler.submitter_key.
+        """
+        raise NotImplementedError()
+
+    def remove_job(self, job_id):
+        """
+        Remove a submission of the job from the queue or the archive. The job itself is removed with its
+        last submission, if it is not running.
+
+        :return: JobRemoval.REMOVED if the job was removed, JobRemoval.RELEASED if only a submission was,
+         or None if nothing was removed.
+        """
+        raise NotImplementedError()
+
+    def mark_job_finished(self, job):
+        raise NotImplementedError()
+
+    def mark_job_error(self, job):
+        raise NotImplementedError()
+
+    def clear_old_jobs(self):
+        """
+        Remove the finished and errored jobs without archiving them.
+        """
+        raise NotImplementedError()
+
+    def archive_jobs(self):
+        """
+        Move the finished and errored jobs from the queue to the archive.
+
+        :return: The number of jobs archived.
+        """
+        raise NotImplementedError()
+
+    def prune_archive(self, max_age, max_count):
+        """
+        Remove archived jobs archived more than max_age seconds ago, then all but the newest max_count.
+        Submitters not served for max_age seconds are forgotten as well.
+
+        :param max_age: Maximum age in seconds of an archived job, 0 for no limit.
+        :param max_count: Maximum number of archived jobs, 0 for no limit.
+        :return: List of the ids of the archived jobs removed.
+        """
+        raise NotImplementedError()
+
+    def is_job_finished(self, job_id):
+        return self.get_job_state(job_id) in (JobState.FINISHED, JobState.ERROR)
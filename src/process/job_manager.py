@@ -1,143 +1,121 @@
-import json
 import os
+import shutil
 
-from filelock import FileLock
+from config import Config
 
-from process import job_controls
+from process import job_controls, scheduler
+from process.queue_json import JsonJobQueue
+from process.queue_sql import SqlJobQueue
 
+_QUEUE_BACKENDS = {
+    'json': JsonJobQueue,
+    'sql': SqlJobQueue,
+}
 
-def _load_queue():
-    """
-    Must have already claimed the queue before calling this function.
-    """
-    try:
-        with open(job_controls.QUEUE_FILE, 'r') as f:
-            content = json.load(f)
-    except FileNotFoundError:
-        content = []
-    except json.decoder.JSONDecodeError:
-        content = []
+_job_queue = None
 
-    return content
 
+def job_queue():
+    """
+    Get the job queue backend set by Config.JOB_QUEUE_BACKEND, created when first needed.
+    """
+    global _job_queue
+    if _job_queue is None:
+        try:
+            backend = _QUEUE_BACKENDS[Config.JOB_QUEUE_BACKEND]
+        except KeyError:
+            raise ValueError(f"Unknown job queue backend: {Config.JOB_QUEUE_BACKEND}")
+        _job_queue = backend()
 
-def _save_queue(queue):
-    with open(job_controls.QUEUE_FILE, 'w') as f:
-        json.dump(queue, f)
+    return _job_queue
 
 
-def create_job(job_id, job_info):
+def create_job(job_id, job_info, fingerprint=None, state=job_controls.JobState.QUEUED, priority=0, submitter=None):
+    """
+    :param fingerprint: Optional fingerprint of the job configuration, see cache.results.job_fingerprint.
+    :param state: State of the new job, a job whose result is already known can be created finished.
+    :param priority: Priority of the job, higher priority jobs are claimed first.
+    :param submitter: Optional identity of who sent the job, for sharing the workers fairly between submitters.
+    """
     return {
         "payload": job_info,
         "id": job_id,
         "source_pid": os.getpid(),
-        "state": job_controls.JobState.QUEUED
+        "state": state,
+        "fingerprint": fingerprint,
+        "priority": priority,
+        "submitter": submitter
     }
 
 
 def list_jobs():
-    jobs = []
-    lock = FileLock(job_controls.QUEUE_LOCK_FILE)
-    with lock:
-        queue = _load_queue()
-        for entry in queue:
-            jobs.append({'id': entry['id'], 'state': entry['state']})
-
-    return jobs
+    return job_queue().list_jobs()
 
 
-def remove_job(job_id):
-    lock = FileLock(job_controls.QUEUE_LOCK_FILE)
-    with lock:
-        queue = _load_queue()
-        remove_index = None
-        for index, entry in enumerate(queue):
-            if entry["id"] == job_id and entry["state"] != job_controls.JobState.RUNNING:
-                remove_index = index
-                break
+def job_schedule():
+    """
+    :return: The jobs in the queue with their scheduling, see scheduler.schedule.
+    """
+    return scheduler.schedule(list_jobs(), job_queue().served_times())
 
-        if remove_index is not None:
-            del queue[remove_index]
-            _save_queue(queue)
-            return True
 
-    return False
+def remove_job(job_id):
+    return job_queue().remove_job(job_id)
 
 
 def send_job(job):
-    lock = FileLock(job_controls.QUEUE_LOCK_FILE)
-    with lock:
-        queue = _load_queue()
-        queue.append(job)
-        _save_queue(queue)
+    job_queue().send_job(job)
 
 
 def get_job_state(job_id):
-    lock = FileLock(job_controls.QUEUE_LOCK_FILE)
-    with lock:
-        queue = _load_queue()
-        for entry in queue:
-            if entry["id"] == job_id:
-                return entry["state"]
+    return job_queue().get_job_state(job_id)
 
-    return "unknown"
 
+def share_active_job(fingerprint, priority=0):
+    return job_queue().share_active_job(fingerprint, priority)
 
-def receive_job():
-    lock = FileLock(job_controls.QUEUE_LOCK_FILE)
-    content = None
-    with lock:
-        queue = _load_queue()
-        for entry in queue:
-            if entry["state"] == job_controls.JobState.QUEUED:
-                entry["state"] = job_controls.JobState.RUNNING
-                content = entry
-                _save_queue(queue)
-                break
 
-    return content
+def receive_job():
+    return job_queue().receive_job()
 
 
 def mark_job_finished(message):
-    lock = FileLock(job_controls.QUEUE_LOCK_FILE)
-    with lock:
-        queue = _load_queue()
-        for entry in queue:
-            if entry["id"] == message["id"] and entry["source_pid"] == message["source_pid"]:
-                entry["state"] = job_controls.JobState.FINISHED
-                _save_queue(queue)
-                break
+    job_queue().mark_job_finished(message)
 
 
 def mark_job_error(message):
-    lock = FileLock(job_controls.QUEUE_LOCK_FILE)
-    with lock:
-        queue = _load_queue()
-        for entry in queue:
-            if entry["id"] == message["id"] and entry["source_pid"] == message["source_pid"]:
-                entry["state"] = job_controls.JobState.ERROR
-                _save_queue(queue)
-                break
+    job_queue().mark_job_error(message)
 
 
-def is_job_finished(job_id):
-    lock = FileLock(job_controls.QUEUE_LOCK_FILE)
-    with lock:
-        queue = _load_queue()
-        for entry in queue:
-            if entry["id"] == job_id:
-                return entry["state"] == job_controls.JobState.FINISHED or entry["state"] == job_controls.JobState.ERROR
+def has_queued_jobs():
+    return any(job['state'] == job_controls.JobState.QUEUED for job in list_jobs())
+
 
-    return False
+def active_job_count():
+    """
+    :return: The number of queued and running jobs.
+    """
+    return sum(job['state'] in (job_controls.JobState.QUEUED, job_controls.JobState.RUNNING) for job in list_jobs())
+
+
+def is_job_finished(job_id):
+    return job_queue().is_job_finished(job_id)
 
 
 def clear_old_jobs():
-    lock = FileLock(job_controls.QUEUE_LOCK_FILE)
-    with lock:
-        queue = _load_queue()
-        refreshed_queue = []
-        for entry in queue:
-            if entry["state"] == job_controls.JobState.QUEUED or entry["state"] == job_controls.JobState.RUNNING:
-                refreshed_queue.append(entry)
-
-        _save_queue(refreshed_queue)
+    job_queue().clear_old_jobs()
+
+
+def compact_jobs():
+    """
+    Move the finished and errored jobs to the archive, then apply the archive retention set in Config.
+    The working directories of the archived jobs removed are deleted.
+
+    :return: Tuple of the number of jobs archived and the number of archived jobs removed.
+    """
+    archived = job_queue().archive_jobs()
+    removed = job_queue().prune_archive(Config.JOB_ARCHIVE_MAX_AGE, Config.JOB_ARCHIVE_MAX_COUNT)
+    for job_id in removed:
+        shutil.rmtree(os.path.join(Config.WORK_DIR, job_id), ignore_errors=True)
+
+    return archived, len(removed)
@@ -1,34 +1,106 @@
-import multiprocessing as mp
+import json
 import os
+import socket
+import subprocess
+import sys
 
 import psutil
 
 from filelock import FileLock
 
-from process.workflow import main as workflow_main
-
 _CONSUMER_PID_FILE = "workflow.pid"
 _CONSUMER_PID_LOCK_FILE = _CONSUMER_PID_FILE + ".lock"
+SUPERVISOR_STATE_FILE = "workflow_supervisor.json"
+_DISPATCHER_SOCKET_FILE = "workflow.sock"
+
+# The directory containing the process package, the supervisor is run from it.
+_SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_supervisor_process = None
 
 
 def _is_pid_active(pid):
-    return psutil.pid_exists(pid)
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except (psutil.NoSuchProcess, ValueError):
+        return False
+
+
+def supervisor_lock(working_directory):
+    return FileLock(os.path.join(working_directory, _CONSUMER_PID_LOCK_FILE))
+
+
+def supervisor_pid_file(working_directory):
+    return os.path.join(working_directory, _CONSUMER_PID_FILE)
+
+
+def dispatcher_socket_file(working_directory):
+    return os.path.join(working_directory, _DISPATCHER_SOCKET_FILE)
+
+
+def notify_dispatcher(working_directory):
+    """
+    Notify a running supervisor that a job has been sent.
+
+    :return: True if a supervisor was notified.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(1.0)
+            connection.connect(dispatcher_socket_file(working_directory))
+    except OSError:
+        return False
+
+    return True
+
+
+def _launch_supervisor(process_python_exe, workflow_location, working_directory):
+    """
+    Run the supervisor in its own process, detached from this one.
+    It is not a multiprocessing child as it starts children of its own, which daemonic processes cannot do.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([_SOURCE_DIR] + [p for p in [env.get('PYTHONPATH')] if p])
+    return subprocess.Popen([sys.executable, '-m', 'process.supervisor', process_python_exe, workflow_location, working_directory],
+                            env=env, stdin=subprocess.DEVNULL, start_new_session=True)
 
 
 def start_workflow_processor(process_python_exe, workflow_location, working_directory):
-    mp.active_children()
-    lock = FileLock(os.path.join(working_directory, _CONSUMER_PID_LOCK_FILE))
-    with lock:
+    """
+    Notify the supervisor of the workflow workers that a job has been sent, starting the supervisor if it is not running.
+    """
+    global _supervisor_process
+    if notify_dispatcher(working_directory):
+        return
+
+    if _supervisor_process is not None and _supervisor_process.poll() is not None:
+        # Reap the previous supervisor.
+        _supervisor_process = None
+
+    with supervisor_lock(working_directory):
         try:
-            with open(os.path.join(working_directory, _CONSUMER_PID_FILE)) as f:
+            with open(supervisor_pid_file(working_directory)) as f:
                 pid_str = f.read()
         except FileNotFoundError:
             pid_str = '-1'
 
         if not _is_pid_active(int(pid_str)):
-            simulation_process = mp.Process(target=workflow_main, args=(process_python_exe, workflow_location, working_directory, ), daemon=True)
-            simulation_process.start()
-            pid = simulation_process.pid
-            if pid is not None:
-                with open(os.path.join(working_directory, _CONSUMER_PID_FILE), 'w') as f:
-                    f.write(str(pid))
+            _supervisor_process = _launch_supervisor(process_python_exe, workflow_location, working_directory)
+            with open(supervisor_pid_file(working_directory), 'w') as f:
+                f.write(str(_supervisor_process.pid))
+
+
+def worker_pool_status(working_directory):
+    """
+    Get the state of the workflow worker pool as last recorded by the supervisor.
+
+    :return: Dict with whether the supervisor is running, the pool size, and the state of each worker.
+    """
+    try:
+        with open(os.path.join(working_directory, SUPERVISOR_STATE_FILE)) as f:
+            status = json.load(f)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        status = {'pid': -1, 'size': 0, 'workers': []}
+
+    status['running'] = _is_pid_active(status['pid'])
+    return status
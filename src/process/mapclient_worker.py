@@ -0,0 +1,139 @@
+"""
+Resident MAP Client worker, run with the processing python so that MAP Client and its plugins are loaded once
+for many jobs instead of once per job::
+
+    <processing python> mapclient_worker.py [--max-jobs N] [--stub]
+    <processing python> mapclient_worker.py --check
+
+Jobs are read from stdin, one JSON object per line with the keys id, workflow, and working_directory.
+For each job one JSON object is written to stdout on a line of its own with the keys id, returncode, message,
+and recycle. recycle is true when the worker exits after this job because it has run --max-jobs jobs.
+Anything else written to stdout, by MAP Client or a plugin, is sent to stderr instead.
+With --check the worker only checks that the installed MAP Client provides what the runner uses, and exits with 0
+if it does and 1 otherwise.
+
+This file must only use the standard library, it does not run in the environment of the backend.
+"""
+import argparse
+import json
+import os
+import sys
+import traceback
+
+# Functions of mapclient.application used by MapClientRunner, not all of them are part of its public interface.
+_REQUIRED_FUNCTIONS = ('_prepare_application', 'prepare_sans_gui_app')
+
+
+class MapClientRunner(object):
+    """
+    Runs workflows with MAP Client, the packages and plugins are loaded when the runner is created.
+    """
+
+    def __init__(self):
+        from mapclient.application import _prepare_application, prepare_sans_gui_app
+
+        self._app = _prepare_application()
+        self._model = prepare_sans_gui_app(self._app)
+        self._model.package_manager().load()
+        self._model.pluginManager().load()
+
+        model = self._model
+
+        class FacadeMainWindow(object):
+
+            def model(self):
+                return model
+
+        self._model.workflowManager().scene().setMainWindow(FacadeMainWindow())
+
+    def run(self, workflow, working_directory):
+        os.chdir(working_directory)
+        wm = self._model.workflowManager()
+        wm.load(workflow)
+        wm.registerDoneExecutionForAll(wm.execute)
+        if wm.canExecute() != 0:
+            return 1, f'Could not execute workflow, reason: "{wm.execute_status_message()}"'
+
+        wm.execute()
+        return 0, ''
+
+
+class StubRunner(object):
+    """
+    Stands in for MAP Client, for testing without it. Each run writes the workflow configuration to the model directory.
+    """
+
+    def run(self, workflow, working_directory):
+        os.chdir(working_directory)
+        configuration = {}
+        for name in sorted(os.listdir(workflow)):
+            if name.endswith('.conf'):
+                with open(os.path.join(workflow, name)) as f:
+                    configuration[name] = json.load(f)
+
+        os.makedirs('model', exist_ok=True)
+        with open(os.path.join('model', 'stub_model.json'), 'w') as f:
+            json.dump(configuration, f)
+
+        return 0, ''
+
+
+def _check():
+    try:
+        import mapclient.application as application
+    except ImportError as e:
+        print(f'Cannot import MAP Client: {e}', file=sys.stderr)
+        return 1
+
+    missing = [name for name in _REQUIRED_FUNCTIONS if not hasattr(application, name)]
+    if missing:
+        print(f'MAP Client does not provide: {", ".join(missing)}', file=sys.stderr)
+        return 1
+
+    return 0
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Run MAP Client workflows for jobs read from stdin.")
+    parser.add_argument("--max-jobs", type=int, default=0, help="Exit after this many jobs, 0 for no limit.")
+    parser.add_argument("--stub", action='store_true', help="Use a stub runner instead of MAP Client.")
+    parser.add_argument("--check", action='store_true', help="Check that MAP Client can be run, then exit.")
+    return parser.parse_args()
+
+
+def _run(runner, job):
+    try:
+        return runner.run(job['workflow'], job['working_directory'])
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) and e.code else 1, f'Workflow exited with: {e.code}'
+    except Exception:
+        return 1, traceback.format_exc()
+
+
+def main():
+    args = _parse_args()
+    if args.check:
+        sys.exit(_check())
+
+    # Keep stdout for replies, and send whatever else is printed to stderr.
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    runner = StubRunner() if args.stub else MapClientRunner()
+    job_count = 0
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+
+        job = json.loads(line)
+        returncode, message = _run(runner, job)
+        job_count += 1
+        recycle = 0 < args.max_jobs <= job_count
+        replies.write(json.dumps({'id': job['id'], 'returncode': returncode, 'message': message, 'recycle': recycle}) + '\n')
+        replies.flush()
+        if recycle:
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import json
+import os
+import tempfile
+import time
+
+from filelock import FileLock
+
+from process import job_controls, scheduler
+
+
+class JsonJobQueue(job_controls.JobQueue):
+    """
+    Job queue kept in a JSON file, every operation holds a lock on the file and rewrites the whole queue.
+    Kept for deployments without a shared database.
+
+    Archived jobs are appended to a JSON lines file, with an index file of the id and offset of each
+    archived job so that an archived job is read without reading the whole archive.
+    The time each submitter was last served is kept in a JSON file of its own.
+    """
+
+    def __init__(self, queue_file=job_controls.QUEUE_FILE, lock_file=job_controls.QUEUE_LOCK_FILE,
+                 archive_file=job_controls.ARCHIVE_FILE, archive_index_file=job_controls.ARCHIVE_INDEX_FILE,
+                 submitters_file=job_controls.SUBMITTERS_FILE):
+        self._queue_file = queue_file
+        self._lock_file = lock_file
+        self._archive_file = archive_file
+        self._archive_index_file = archive_index_file
+        self._submitters_file = submitters_file
+        # The archive index read so far, with the inode and size of the index file it was read from.
+        self._archive_index = {}
+        self._archive_index_read = (None, 0)
+
+    def _lock(self):
+        return FileLock(self._lock_file)
+
+    def _load_queue(self):
+        """
+        Must have already claimed the queue before calling this function.
+        """
+        try:
+            with open(self._queue_file, 'r') as f:
+                content = json.load(f)
+        except FileNotFoundError:
+            content = []
+        except json.decoder.JSONDecodeError:
+            content = []
+
+        return content
+
+    def _save_queue(self, queue):
+        with open(self._queue_file, 'w') as f:
+            json.dump(queue, f)
+
+    def _load_served(self):
+        """
+        Must have already claimed the queue before calling this function.
+        """
+        try:
+            with open(self._submitters_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return {}
+
+    def _save_served(self, served):
+        with open(self._submitters_file, 'w') as f:
+            json.dump(served, f)
+
+    def served_times(self):
+        with self._lock():
+            return self._load_served()
+
+    def jobs(self):
+        """
+        :return: List of all the jobs in the queue.
+        """
+        with self._lock():
+            return self._load_queue()
+
+    def list_jobs(self):
+        jobs = []
+        with self._lock():
+            queue = self._load_queue()
+            for entry in queue:
+                jobs.append({'id': entry['id'], 'state': entry['state'], 'priority': entry.get('priority', 0),
+                             'submitter': entry.get('submitter'), 'queued_at': entry.get('queued_at')})
+
+        return jobs
+
+    def remove_job(self, job_id):
+        with self._lock():
+            queue = self._load_queue()
+            for index, entry in enumerate(queue):
+                if entry["id"] != job_id:
+                    continue
+                if entry.get("submissions", 1) > 1:
+                    entry["submissions"] -= 1
+                    self._save_queue(queue)
+                    return job_controls.JobRemoval.RELEASED
+                if entry["state"] == job_controls.JobState.RUNNING:
+                    return None
+                del queue[index]
+                self._save_queue(queue)
+                return job_controls.JobRemoval.REMOVED
+
+            archived_job = self._archived_job(job_id)
+            if archived_job is not None:
+                with open(self._archive_file, 'r') as f:
+                    lines = f.readlines()
+                if archived_job.get("submissions", 1) > 1:
+                    archived_job["submissions"] -= 1
+                    lines = [json.dumps(archived_job) + '\n' if json.loads(line)['id'] == job_id else line
+                             for line in lines]
+                    removal = job_controls.JobRemoval.RELEASED
+                else:
+                    lines = [line for line in lines if json.loads(line)['id'] != job_id]
+                    removal = job_controls.JobRemoval.REMOVED
+                self._rewrite_archive(lines)
+                return removal
+
+        return None
+
+    def send_job(self, job):
+        with self._lock():
+            queue = self._load_queue()
+            queue.append(dict(job, queued_at=time.time(), submissions=1))
+            self._save_queue(queue)
+
+    def get_job_state(self, job_id):
+        with self._lock():
+            queue = self._load_queue()
+            for entry in queue:
+                if entry["id"] == job_id:
+                    return entry["state"]
+
+            archived_job = self._archived_job(job_id)
+
+        return "unknown" if archived_job is None else archived_job["state"]
+
+    def share_active_job(self, fingerprint, priority):
+        active_states = (job_controls.JobState.QUEUED, job_controls.JobState.RUNNING)
+        with self._lock():
+            queue = self._load_queue()
+            for entry in queue:
+                if entry.get("fingerprint") == fingerprint and entry["state"] in active_states:
+                    entry["submissions"] = entry.get("submissions", 1) + 1
+                    entry["priority"] = max(entry.get("priority", 0), priority)
+                    self._save_queue(queue)
+                    return entry["id"]
+
+        return None
+
+    def receive_job(self):
+        with self._lock():
+            queue = self._load_queue()
+            served = self._load_served()
+            content = scheduler.next_job(queue, served)
+            if content is not None:
+                content["state"] = job_controls.JobState.RUNNING
+                served[scheduler.submitter_key(content.get("submitter"))] = time.time()
+                self._save_queue(queue)
+                self._save_served(served)
+
+        return content
+
+    def _mark_job(self, message, state):
+        with self._lock():
+            queue = self._load_queue()
+            for entry in queue:
+                if entry["id"] == message["id"] and entry["source_pid"] == message["source_pid"]:
+                    entry["state"] = state
+                    self._save_queue(queue)
+                    break
+
+    def mark_job_finished(self, message):
+        self._mark_job(message, job_controls.JobState.FINISHED)
+
+    def mark_job_error(self, message):
+        self._mark_job(message, job_controls.JobState.ERROR)
+
+    def clear_old_jobs(self):
+        with self._lock():
+            queue = self._load_queue()
+            refreshed_queue = []
+            for entry in queue:
+                if entry["state"] == job_controls.JobState.QUEUED or entry["state"] == job_controls.JobState.RUNNING:
+                    refreshed_queue.append(entry)
+
+            self._save_queue(refreshed_queue)
+
+    def _refresh_archive_index(self):
+        """
+        Must have already claimed the queue before calling this function.
+        Reads the entries added to the index file since it was last read, or all of it if it has been rewritten.
+        """
+        try:
+            stat = os.stat(self._archive_index_file)
+        except FileNotFoundError:
+            self._archive_index = {}
+            self._archive_index_read = (None, 0)
+            return
+
+        inode, position = self._archive_index_read
+        if inode != stat.st_ino or position > stat.st_size:
+            self._archive_index = {}
+            position = 0
+
+        with open(self._archive_index_file, 'r') as f:
+            f.seek(position)
+            for line in f:
+                job_id, offset = line.split()
+                self._archive_index[job_id] = int(offset)
+            self._archive_index_read = (stat.st_ino, f.tell())
+
+    def _archived_job(self, job_id):
+        """
+        Must have already claimed the queue before calling this function.
+        """
+        self._refresh_archive_index()
+        offset = self._archive_index.get(job_id)
+        if offset is None:
+            return None
+
+        with open(self._archive_file, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def archive_jobs(self):
+        with self._lock():
+            queue = self._load_queue()
+            done_states = (job_controls.JobState.FINISHED, job_controls.JobState.ERROR)
+            done_jobs = [entry for entry in queue if entry["state"] in done_states]
+            if not done_jobs:
+                return 0
+
+            archived_at = time.time()
+            with open(self._archive_file, 'a') as archive, open(self._archive_index_file, 'a') as index:
+                offset = archive.seek(0, os.SEEK_END)
+                index_lines = []
+                for entry in done_jobs:
+                    line = json.dumps(dict(entry, archived_at=archived_at)) + '\n'
+                    archive.write(line)
+                    index_lines.append(f"{entry['id']} {offset}\n")
+                    offset += len(line.encode())
+                # The index must never refer to entries that are not in the archive.
+                archive.flush()
+                os.fsync(archive.fileno())
+                index.writelines(index_lines)
+
+            self._save_queue([entry for entry in queue if entry["state"] not in done_states])
+
+        return len(done_jobs)
+
+    def prune_archive(self, max_age, max_count):
+        with self._lock():
+            if max_age:
+                served = self._load_served()
+                oldest = time.time() - max_age
+                recent = {submitter: served_at for submitter, served_at in served.items() if served_at >= oldest}
+                if len(recent) < len(served):
+                    self._save_served(recent)
+
+            try:
+                with open(self._archive_file, 'r') as f:
+                    lines = f.readlines()
+            except FileNotFoundError:
+                return []
+
+            # Jobs are appended in the order they are archived, so the jobs to keep are at the end.
+            start = 0
+            if max_age:
+                oldest = time.time() - max_age
+                while start < len(lines) and json.loads(lines[start])['archived_at'] < oldest:
+                    start += 1
+            if max_count:
+                start = max(start, len(lines) - max_count)
+            if start == 0:
+                return []
+
+            self._rewrite_archive(lines[start:])
+
+        return [json.loads(line)['id'] for line in lines[:start]]
+
+    def _rewrite_archive(self, lines):
+        directory = os.path.dirname(os.path.abspath(self._archive_file))
+        index_lines = []
+        offset = 0
+        fd, archive_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        with os.fdopen(fd, 'w') as archive:
+            for line in lines:
+                archive.write(line)
+                index_lines.append(f"{json.loads(line)['id']} {offset}\n")
+                offset += len(line.encode())
+        fd, index_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        with os.fdopen(fd, 'w') as index:
+            index.writelines(index_lines)
+
+        # Readers hold the queue lock, so they never see the archive and the index out of step.
+        os.replace(archive_path, self._archive_file)
+        os.replace(index_path, self._archive_index_file)
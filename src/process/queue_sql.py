@@ -0,0 +1,241 @@
+import json
+import os
+import time
+
+from sqlalchemy import and_, or_, case, func, literal, select, true
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+
+from db.common import create_database_engine
+from db.tables import Job, JobArchive, JobSubmitter
+
+from process import job_controls, scheduler
+
+_jobs = Job.__table__
+_archive = JobArchive.__table__
+_submitters = JobSubmitter.__table__
+_DONE_STATES = [job_controls.JobState.FINISHED, job_controls.JobState.ERROR]
+_ACTIVE_STATES = [job_controls.JobState.QUEUED, job_controls.JobState.RUNNING]
+# Most job ids to bind in one statement, well within SQLite's limit of 999 bound parameters.
+_ID_BATCH_SIZE = 500
+
+
+class SqlJobQueue(job_controls.JobQueue):
+    """
+    Job queue kept in the jobs table of the database.
+    Lookups are by primary key, and a job is claimed with a conditional update so that
+    many consumers can share the queue without a global lock.
+    """
+
+    def __init__(self, database_uri=None):
+        self._database_uri = database_uri
+        self._engine = None
+        self._pid = None
+
+    def _connect(self):
+        # Connections must not be shared with a parent process, so each process creates its own engine.
+        if self._pid != os.getpid():
+            self._engine = create_database_engine(self._database_uri or Config.SQLALCHEMY_DATABASE_URI)
+            self._pid = os.getpid()
+
+        return self._engine.begin()
+
+    def send_job(self, job):
+        with self._connect() as connection:
+            connection.execute(_jobs.insert(), {'id': job['id'], 'state': job['state'], 'source_pid': job['source_pid'],
+                                                'payload': json.dumps(job['payload']), 'queued_at': time.time(),
+                                                'fingerprint': job.get('fingerprint'),
+                                                'priority': job.get('priority', 0), 'submitter': job.get('submitter'),
+                                                'submissions': 1})
+
+    @staticmethod
+    def _not_held(submitter):
+        """
+        Condition that submitter may have another job running, see scheduler.is_held.
+        """
+        if Config.JOB_SUBMITTER_MAX_RUNNING <= 0:
+            return true()
+
+        running = _jobs.alias('running')
+        return or_(submitter.is_(None),
+                   select([func.count()]).where(and_(running.c.submitter == submitter,
+                                                     running.c.state == job_controls.JobState.RUNNING)).
+                   as_scalar() < Config.JOB_SUBMITTER_MAX_RUNNING)
+
+    @staticmethod
+    def _claim_order():
+        """
+        The order of scheduler.schedule_key: priority, then the running jobs and the last service of the submitter.
+        """
+        running = _jobs.alias('running')
+        running_count = select([func.count()]).where(and_(running.c.submitter.isnot_distinct_from(_jobs.c.submitter),
+                                                          running.c.state == job_controls.JobState.RUNNING)).as_scalar()
+        served_at = select([_submitters.c.served_at]).where(
+            _submitters.c.submitter == func.coalesce(_jobs.c.submitter, scheduler.submitter_key(None))).as_scalar()
+        return _jobs.c.priority.desc(), running_count, func.coalesce(served_at, 0.0), _jobs.c.queued_at
+
+    @staticmethod
+    def _mark_served(connection, submitter):
+        key = scheduler.submitter_key(submitter)
+        served_at = time.time()
+        result = connection.execute(_submitters.update().where(_submitters.c.submitter == key).
+                                    values(served_at=served_at))
+        if result.rowcount == 0:
+            connection.execute(_submitters.insert(), {'submitter': key, 'served_at': served_at})
+
+    def receive_job(self):
+        while True:
+            with self._connect() as connection:
+                row = connection.execute(select([_jobs.c.id, _jobs.c.source_pid, _jobs.c.payload, _jobs.c.fingerprint,
+                                                 _jobs.c.submitter]).
+                                         where(and_(_jobs.c.state == job_controls.JobState.QUEUED,
+                                                    self._not_held(_jobs.c.submitter))).
+                                         order_by(*self._claim_order()).
+                                         limit(1)).first()
+            if row is None:
+                return None
+
+            # The claim is a separate write only transaction, so it waits for other writers rather than
+            # failing on a snapshot that is out of date. The limit on running jobs is checked again as part of it.
+            try:
+                with self._connect() as connection:
+                    result = connection.execute(_jobs.update().
+                                                where(and_(_jobs.c.id == row.id,
+                                                           _jobs.c.state == job_controls.JobState.QUEUED,
+                                                           self._not_held(_jobs.c.submitter))).
+                                                values(state=job_controls.JobState.RUNNING))
+                    if result.rowcount == 1:
+                        self._mark_served(connection, row.submitter)
+            except IntegrityError:
+                # The submitter was first served by another consumer at the same time, the claim is undone.
+                continue
+            if result.rowcount == 1:
+                return {
+                    "payload": json.loads(row.payload),
+                    "id": row.id,
+                    "source_pid": row.source_pid,
+                    "state": job_controls.JobState.RUNNING,
+                    "fingerprint": row.fingerprint
+                }
+            # Claimed by another consumer in the meantime, try the next queued job.
+
+    def get_job_state(self, job_id):
+        with self._connect() as connection:
+            state = connection.execute(select([_jobs.c.state]).where(_jobs.c.id == job_id)).scalar()
+            if state is None:
+                state = connection.execute(select([_archive.c.state]).where(_archive.c.id == job_id)).scalar()
+
+        return "unknown" if state is None else state
+
+    def share_active_job(self, fingerprint, priority):
+        while True:
+            with self._connect() as connection:
+                job_id = connection.execute(select([_jobs.c.id]).
+                                            where(and_(_jobs.c.fingerprint == fingerprint,
+                                                       _jobs.c.state.in_(_ACTIVE_STATES))).
+                                            order_by(_jobs.c.queued_at).
+                                            limit(1)).scalar()
+                if job_id is None:
+                    return None
+
+                result = connection.execute(_jobs.update().
+                                            where(and_(_jobs.c.id == job_id, _jobs.c.state.in_(_ACTIVE_STATES))).
+                                            values(submissions=_jobs.c.submissions + 1,
+                                                   priority=case([(_jobs.c.priority < priority, priority)],
+                                                                 else_=_jobs.c.priority)))
+            if result.rowcount == 1:
+                return job_id
+            # Finished in the meantime, look for another.
+
+    def list_jobs(self):
+        with self._connect() as connection:
+            result = connection.execute(select([_jobs.c.id, _jobs.c.state, _jobs.c.priority, _jobs.c.submitter,
+                                                _jobs.c.queued_at]).order_by(_jobs.c.queued_at))
+            return [{'id': r.id, 'state': r.state, 'priority': r.priority, 'submitter': r.submitter,
+                     'queued_at': r.queued_at} for r in result]
+
+    def served_times(self):
+        with self._connect() as connection:
+            return dict(connection.execute(select([_submitters.c.submitter, _submitters.c.served_at])).fetchall())
+
+    def remove_job(self, job_id):
+        with self._connect() as connection:
+            for table_, removable in ((_jobs, _jobs.c.state != job_controls.JobState.RUNNING), (_archive, true())):
+                result = connection.execute(table_.update().
+                                            where(and_(table_.c.id == job_id, table_.c.submissions > 1)).
+                                            values(submissions=table_.c.submissions - 1))
+                if result.rowcount == 1:
+                    return job_controls.JobRemoval.RELEASED
+
+                result = connection.execute(table_.delete().where(and_(table_.c.id == job_id, removable)))
+                if result.rowcount == 1:
+                    return job_controls.JobRemoval.REMOVED
+
+        return None
+
+    def _mark_job(self, message, state):
+        with self._connect() as connection:
+            connection.execute(_jobs.update().
+                               where(and_(_jobs.c.id == message["id"], _jobs.c.source_pid == message["source_pid"])).
+                               values(state=state))
+
+    def mark_job_finished(self, message):
+        self._mark_job(message, job_controls.JobState.FINISHED)
+
+    def mark_job_error(self, message):
+        self._mark_job(message, job_controls.JobState.ERROR)
+
+    def clear_old_jobs(self):
+        with self._connect() as connection:
+            connection.execute(_jobs.delete().where(_jobs.c.state.in_(_DONE_STATES)))
+
+    def archive_jobs(self):
+        with self._connect() as connection:
+            job_ids = [r.id for r in connection.execute(select([_jobs.c.id]).where(_jobs.c.state.in_(_DONE_STATES)))]
+        if not job_ids:
+            return 0
+
+        # Only the jobs found above are moved, jobs finishing meanwhile are left for the next time.
+        archived_at = time.time()
+        try:
+            with self._connect() as connection:
+                for start in range(0, len(job_ids), _ID_BATCH_SIZE):
+                    batch = job_ids[start:start + _ID_BATCH_SIZE]
+                    connection.execute(_archive.insert().from_select(
+                        ['id', 'state', 'source_pid', 'payload', 'queued_at', 'submissions', 'archived_at'],
+                        select([_jobs.c.id, _jobs.c.state, _jobs.c.source_pid, _jobs.c.payload, _jobs.c.queued_at,
+                                _jobs.c.submissions, literal(archived_at)]).where(_jobs.c.id.in_(batch))))
+                    connection.execute(_jobs.delete().where(_jobs.c.id.in_(batch)))
+        except IntegrityError:
+            # Archived by another process at the same time.
+            return 0
+
+        return len(job_ids)
+
+    @staticmethod
+    def _delete_archived(connection, condition):
+        job_ids = [r.id for r in connection.execute(select([_archive.c.id]).where(condition))]
+        if job_ids:
+            connection.execute(_archive.delete().where(condition))
+
+        return job_ids
+
+    def prune_archive(self, max_age, max_count):
+        removed = []
+        with self._connect() as connection:
+            if max_age:
+                removed += self._delete_archived(connection, _archive.c.archived_at < time.time() - max_age)
+                connection.execute(_submitters.delete().where(_submitters.c.served_at < time.time() - max_age))
+            if max_count:
+                # The newest job past max_count, it and every older job are removed.
+                cutoff = connection.execute(select([_archive.c.archived_at, _archive.c.id]).
+                                            order_by(_archive.c.archived_at.desc(), _archive.c.id.desc()).
+                                            offset(max_count).
+                                            limit(1)).first()
+                if cutoff is not None:
+                    removed += self._delete_archived(connection, or_(
+                        _archive.c.archived_at < cutoff.archived_at,
+                        and_(_archive.c.archived_at == cutoff.archived_at, _archive.c.id <= cutoff.id)))
+
+        return removed
@@ -0,0 +1,123 @@
+"""
+Scheduling of queued jobs, shared by the job queue backends.
+
+Jobs are claimed highest priority first. Among jobs of the same priority the submitters take turns, decided when
+a job is claimed: the job claimed is one of the submitter with the fewest jobs running, and of those the submitter
+served least recently, that is whose last job was claimed longest ago. A submitter's own jobs run in the order sent.
+So a submitter sending many jobs does not hold up a submitter sending a job later, however long the jobs take.
+Jobs of a submitter with Config.JOB_SUBMITTER_MAX_RUNNING jobs running are held until one of them is done.
+"""
+from config import Config
+
+from process import job_controls
+
+
+def submitter_key(submitter):
+    """
+    :return: The key of the submitter in the served times, jobs without a submitter share the turns of one submitter.
+    """
+    return submitter or ''
+
+
+def running_counts(jobs):
+    """
+    :return: Dict of the number of running jobs of each submitter.
+    """
+    counts = {}
+    for job in jobs:
+        if job['state'] == job_controls.JobState.RUNNING:
+            submitter = job.get('submitter')
+            counts[submitter] = counts.get(submitter, 0) + 1
+
+    return counts
+
+
+def schedule_key(job, counts, served):
+    """
+    Sort key putting queued jobs in the order they are claimed, not taking held submitters into account.
+
+    :param counts: Running job counts, see running_counts.
+    :param served: Dict of the time each submitter was last served, see submitter_key.
+    """
+    submitter = job.get('submitter')
+    return (-(job.get('priority') or 0), counts.get(submitter, 0), served.get(submitter_key(submitter), 0.0),
+            job.get('queued_at') or 0.0)
+
+
+def is_held(submitter, counts):
+    """
+    :param counts: Running job counts, see running_counts.
+    :return: True if the submitter may not have another job running.
+    """
+    return (Config.JOB_SUBMITTER_MAX_RUNNING > 0 and submitter is not None and
+            counts.get(submitter, 0) >= Config.JOB_SUBMITTER_MAX_RUNNING)
+
+
+def _queued_in_order(jobs, counts, served):
+    return sorted((job for job in jobs if job['state'] == job_controls.JobState.QUEUED),
+                  key=lambda job: schedule_key(job, counts, served))
+
+
+def next_job(jobs, served):
+    """
+    :param jobs: The jobs in the queue.
+    :param served: Dict of the time each submitter was last served, see submitter_key.
+    :return: The queued job to claim next, or None if no queued job may be claimed.
+    """
+    counts = running_counts(jobs)
+    return next((job for job in _queued_in_order(jobs, counts, served) if not is_held(job.get('submitter'), counts)),
+                None)
+
+
+def _claim_order(jobs, counts, served):
+    """
+    The queued jobs in the order they would be claimed, if no job finishes or is sent in the meantime.
+    """
+    counts = dict(counts)
+    served = dict(served)
+    # Each submitter's jobs in the order that submitter's jobs are claimed, the next is always the first.
+    waiting = {}
+    for job in sorted((job for job in jobs if job['state'] == job_controls.JobState.QUEUED),
+                      key=lambda job: (-(job.get('priority') or 0), job.get('queued_at') or 0.0)):
+        waiting.setdefault(job.get('submitter'), []).append(job)
+    for submitter_jobs in waiting.values():
+        submitter_jobs.reverse()
+
+    now = max(served.values(), default=0.0)
+    order = []
+    while waiting:
+        job = min((submitter_jobs[-1] for submitter_jobs in waiting.values()),
+                  key=lambda job: schedule_key(job, counts, served))
+        submitter = job.get('submitter')
+        waiting[submitter].pop()
+        if not waiting[submitter]:
+            del waiting[submitter]
+        order.append(job)
+        counts[submitter] = counts.get(submitter, 0) + 1
+        now += 1.0
+        served[submitter_key(submitter)] = now
+
+    return order
+
+
+def schedule(jobs, served):
+    """
+    Describe the scheduling of the jobs in the queue.
+
+    :param served: Dict of the time each submitter was last served, see submitter_key.
+    :return: List of dicts with the id, state, priority, and submitter of each job. Queued jobs also have their
+     position in the order of claiming, from 1, and whether they are held by the limit on running jobs.
+     The order assumes no job finishes and no job is sent in the meantime, and ignores the limit on running jobs.
+    """
+    counts = running_counts(jobs)
+    positions = {job['id']: position for position, job in enumerate(_claim_order(jobs, counts, served), start=1)}
+    described = []
+    for job in jobs:
+        entry = {'id': job['id'], 'state': job['state'], 'priority': job.get('priority') or 0,
+                 'submitter': job.get('submitter')}
+        if job['id'] in positions:
+            entry['position'] = positions[job['id']]
+            entry['held'] = is_held(job.get('submitter'), counts)
+        described.append(entry)
+
+    return described
@@ -0,0 +1,221 @@
+"""
+Supervisor of the workflow workers, started by manager.start_workflow_processor with::
+
+    python -m process.supervisor <processing python> <workflow directory> <working directory>
+
+The supervisor listens on the unix socket manager.DISPATCHER_SOCKET_FILE in the working directory,
+a connection to it notifies that a job has been sent, see manager.notify_dispatcher.
+On a notification a waiting worker is woken, and workers are started up to one for each queued or running job,
+at most the pool size, so a single job does not start the whole pool.
+A worker that crashes has the job it was processing marked as an error, and is restarted if jobs remain.
+The state of the pool is written to manager.SUPERVISOR_STATE_FILE in the working directory.
+
+Without notifications the waits double, up to Config.WORKFLOW_MAX_WAIT seconds, and the queue is checked
+after each wait for jobs sent without a notification. The supervisor shuts down when every worker has shut down,
+after Config.WORKFLOW_IDLE_SHUTDOWN seconds without a job, and no jobs are queued.
+"""
+import json
+import multiprocessing as mp
+import os
+import select
+import socket
+import sys
+import tempfile
+import time
+
+import psutil
+
+from config import Config
+
+from process.job_manager import active_job_count, has_queued_jobs, mark_job_error, compact_jobs
+from process.manager import SUPERVISOR_STATE_FILE, supervisor_lock, supervisor_pid_file, dispatcher_socket_file
+from process.workflow import main as workflow_main, MIN_WAIT
+
+
+def worker_count():
+    """
+    Get the number of workers from Config, a count of 0 means one worker per physical CPU.
+    """
+    if Config.WORKFLOW_WORKERS > 0:
+        return Config.WORKFLOW_WORKERS
+
+    return psutil.cpu_count(logical=False) or psutil.cpu_count() or 1
+
+
+def workers_wanted(pool_size, active_jobs):
+    """
+    :param active_jobs: The number of queued and running jobs.
+    :return: The number of workers to have running, one for each job up to the pool size.
+    """
+    return min(pool_size, active_jobs)
+
+
+class _Worker(object):
+
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.started = None
+        self.restarts = 0
+        self.exitcode = None
+        # The id and source pid of the job the worker is processing.
+        self.current_job = mp.Array('c', 128)
+
+    def start(self, process_python_exe, workflow_location, working_directory, wake):
+        self.current_job.value = b''
+        self.process = mp.Process(target=workflow_main,
+                                  args=(process_python_exe, workflow_location, working_directory, self.current_job, wake, ))
+        self.process.start()
+        self.started = time.time()
+
+    def reap(self):
+        """
+        Collect the worker if it has shut down.
+
+        :return: True if the worker crashed.
+        """
+        if self.process is None or self.process.is_alive():
+            return False
+
+        self.process.join()
+        self.exitcode = self.process.exitcode
+        self.process = None
+        return self.exitcode != 0
+
+    def state(self):
+        return {
+            'index': self.index,
+            'pid': self.process.pid if self.process is not None else None,
+            'alive': self.process is not None,
+            'job': self.current_job.value.decode().split()[0] if self.current_job.value else None,
+            'started': self.started,
+            'restarts': self.restarts,
+            'last_exitcode': self.exitcode,
+        }
+
+
+def _write_state(working_directory, workers):
+    state = {'pid': os.getpid(), 'size': len(workers), 'updated': time.time(),
+             'workers': [worker.state() for worker in workers]}
+    fd, staging_path = tempfile.mkstemp(dir=working_directory, suffix='.part')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f)
+    os.replace(staging_path, os.path.join(working_directory, SUPERVISOR_STATE_FILE))
+
+
+def _listen(working_directory):
+    path = dispatcher_socket_file(working_directory)
+    try:
+        # Left by a supervisor that did not shut down cleanly.
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(16)
+    server.setblocking(False)
+    return server
+
+
+def _close(working_directory, server):
+    server.close()
+    try:
+        os.remove(dispatcher_socket_file(working_directory))
+    except FileNotFoundError:
+        pass
+
+
+def _accept_notifications(server):
+    """
+    :return: The number of notifications waiting.
+    """
+    count = 0
+    while True:
+        try:
+            connection, _ = server.accept()
+        except BlockingIOError:
+            return count
+
+        connection.close()
+        count += 1
+
+
+def _finished(working_directory, server):
+    """
+    Release the socket and the supervisor pid file if there is no more work, under the same lock used to start
+    a supervisor. The socket is closed before the queue is checked, so a job sent meanwhile is either seen here
+    or its notification fails and starts a new supervisor.
+    """
+    with supervisor_lock(working_directory):
+        _close(working_directory, server)
+        if has_queued_jobs():
+            return False
+
+        try:
+            os.remove(supervisor_pid_file(working_directory))
+        except FileNotFoundError:
+            pass
+
+    return True
+
+
+def main(process_python_exe, workflow_location, working_directory):
+    workers = [_Worker(index) for index in range(worker_count())]
+    wake = mp.Semaphore(0)
+    server = _listen(working_directory)
+    wait = MIN_WAIT
+    idle_since = time.time()
+    last_compaction = 0.0
+    active_jobs = active_job_count()
+    while True:
+        for worker in workers:
+            if worker.reap():
+                print(f'Workflow worker {worker.index} exited with {worker.exitcode}.')
+                worker.restarts += 1
+                if worker.current_job.value:
+                    job_id, source_pid = worker.current_job.value.decode().split()
+                    mark_job_error({'id': job_id, 'source_pid': int(source_pid)})
+                # Do not restart in a tight loop if the worker crashes straight away.
+                time.sleep(MIN_WAIT)
+        alive = sum(worker.process is not None for worker in workers)
+        for worker in workers:
+            if alive >= workers_wanted(len(workers), active_jobs):
+                break
+            if worker.process is None:
+                worker.start(process_python_exe, workflow_location, working_directory, wake)
+                alive += 1
+        if active_jobs:
+            idle_since = time.time()
+
+        _write_state(working_directory, workers)
+        if time.time() - last_compaction >= Config.JOB_COMPACTION_INTERVAL:
+            compact_jobs()
+            last_compaction = time.time()
+
+        if all(worker.process is None for worker in workers) and \
+                time.time() - idle_since >= Config.WORKFLOW_IDLE_SHUTDOWN:
+            if _finished(working_directory, server):
+                break
+            server = _listen(working_directory)
+            active_jobs = active_job_count()
+            continue
+
+        sentinels = [worker.process.sentinel for worker in workers if worker.process is not None]
+        readable, _, _ = select.select([server] + sentinels, [], [], wait)
+        notifications = _accept_notifications(server) if server in readable else 0
+        for _ in range(notifications):
+            wake.release()
+        if notifications:
+            wait = MIN_WAIT
+        elif not readable:
+            wait = min(wait * 2, Config.WORKFLOW_MAX_WAIT)
+        # Also finds jobs sent without a notification, and jobs left when a worker shut down.
+        active_jobs = active_job_count()
+
+    # Archive the jobs finished since the last compaction before shutting down.
+    compact_jobs()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4])
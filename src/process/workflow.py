@@ -4,8 +4,155 @@ import shutil
 import subprocess
 import time
 
+from config import Config
+
+from cache.results import result_cache
+
 from process.job_manager import receive_job, mark_job_finished, mark_job_error
 
+# The first wait for a job, in seconds.
+MIN_WAIT = 0.2
+
+
+# Files each job gets a private copy of, everything else in the workflow is shared.
+_JOB_PRIVATE_SUFFIXES = ('.conf', '.proj')
+
+# Run with the processing python by ResidentWorkflowRunner.
+_RESIDENT_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mapclient_worker.py')
+
+
+class SubprocessWorkflowRunner(object):
+    """
+    Runs each workflow with a new MAP Client process.
+    """
+
+    def __init__(self, process_python_exe):
+        self._process_python_exe = process_python_exe
+
+    def run(self, workflow_location, working_directory):
+        result = subprocess.run([self._process_python_exe, '-m', 'mapclient.application', '-x', '--headless', '-w', workflow_location],
+                                cwd=working_directory)
+        return result.returncode
+
+    def close(self):
+        pass
+
+
+class ResidentWorkflowRunner(object):
+    """
+    Runs workflows with a resident MAP Client worker, see mapclient_worker.py, so MAP Client and its plugins
+    are loaded once for many jobs. The worker is started when first needed, and again after it exits,
+    either by being recycled after max_jobs jobs or by dying.
+    """
+
+    def __init__(self, process_python_exe, max_jobs=0, stub=False):
+        self._process_python_exe = process_python_exe
+        self._max_jobs = max_jobs
+        self._stub = stub
+        self._process = None
+        self._job_count = 0
+
+    @staticmethod
+    def is_supported(process_python_exe):
+        """
+        :return: True if the MAP Client installed for the processing python provides what the worker uses.
+        """
+        result = subprocess.run([process_python_exe, _RESIDENT_WORKER_SCRIPT, '--check'])
+        return result.returncode == 0
+
+    def _start(self):
+        args = [self._process_python_exe, _RESIDENT_WORKER_SCRIPT, '--max-jobs', str(self._max_jobs)]
+        if self._stub:
+            args.append('--stub')
+        self._process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+    def run(self, workflow_location, working_directory):
+        if self._process is not None and self._process.poll() is not None:
+            self.close()
+        if self._process is None:
+            self._start()
+
+        self._job_count += 1
+        job = {'id': self._job_count, 'workflow': workflow_location, 'working_directory': working_directory}
+        try:
+            self._process.stdin.write(json.dumps(job) + '\n')
+            self._process.stdin.flush()
+            reply = self._process.stdout.readline()
+        except BrokenPipeError:
+            reply = ''
+
+        if not reply:
+            print(f'Resident workflow worker exited with {self._process.wait()}.')
+            self.close()
+            return 1
+
+        result = json.loads(reply)
+        if result['message']:
+            print(result['message'])
+        if result['recycle']:
+            self.close()
+
+        return result['returncode']
+
+    def close(self):
+        """
+        Stop the worker, closing its stdin ends it after the job it is running.
+        """
+        if self._process is None:
+            return
+
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            self._process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        self._process.stdout.close()
+        self._process = None
+
+
+def workflow_runner(process_python_exe):
+    """
+    Create the workflow runner set by Config.WORKFLOW_RUNNER.
+    The resident runner falls back to the subprocess runner if the installed MAP Client does not support it.
+    """
+    if Config.WORKFLOW_RUNNER == 'subprocess':
+        return SubprocessWorkflowRunner(process_python_exe)
+    if Config.WORKFLOW_RUNNER == 'resident' and not ResidentWorkflowRunner.is_supported(process_python_exe):
+        print('Warning: the installed MAP Client cannot be run by the resident workflow worker, '
+              'running each workflow with a new MAP Client process instead.')
+        return SubprocessWorkflowRunner(process_python_exe)
+    if Config.WORKFLOW_RUNNER in ('resident', 'stub'):
+        return ResidentWorkflowRunner(process_python_exe, Config.WORKFLOW_RESIDENT_MAX_JOBS, Config.WORKFLOW_RUNNER == 'stub')
+
+    raise ValueError(f"Unknown workflow runner: {Config.WORKFLOW_RUNNER}")
+
+
+def prepare_job_workflow(workflow_location, job_working_directory):
+    """
+    Create a copy of the workflow for a job in the job working directory.
+    The configuration and project files are copied, every other entry is linked to the original workflow,
+    so jobs can apply their own configuration without affecting each other.
+
+    :return: Location of the job's copy of the workflow.
+    """
+    job_workflow_location = os.path.join(job_working_directory, 'workflow')
+    if os.path.isdir(job_workflow_location):
+        shutil.rmtree(job_workflow_location)
+    os.makedirs(job_workflow_location)
+
+    for entry in os.scandir(workflow_location):
+        destination = os.path.join(job_workflow_location, entry.name)
+        if entry.is_file() and entry.name.endswith(_JOB_PRIVATE_SUFFIXES):
+            shutil.copy2(entry.path, destination)
+        else:
+            os.symlink(os.path.abspath(entry.path), destination)
+
+    return job_workflow_location
+
 
 def apply_config(config, file):
     with open(file) as f:
@@ -17,11 +164,12 @@ def apply_config(config, file):
         f.write(json.dumps(loaded_config))
 
 
-def main(process_python_exe, workflow_location, working_directory):
-    # Set the number of attempts to read a message before shutting down.
-    max_attempts = 3
-    attempts = 0
+def process_job(process_python_exe, workflow_location, content, runner=None):
+    """
+    Run the workflow for a claimed job and mark the job as finished or as an error.
 
+    :param runner: Optional workflow runner, by default the workflow is run with a new MAP Client process.
+    """
     # Map the configuration received from the application to the configuration in the workflow.
     map_app_config_to_workflow_config = {
         'input': 'TRC_Source.conf',
@@ -30,30 +178,61 @@ def main(process_python_exe, workflow_location, working_directory):
         'muscle': 'musc_cust.conf'
     }
 
-    while attempts < max_attempts:
-        time.sleep(0.2)
-        attempts += 1
-        content = receive_job()
-
-        if content is not None:
-            # Apply config
-            payload = content['payload']
-            for config in payload:
-                if config in map_app_config_to_workflow_config.keys():
-                    apply_config(payload[config], os.path.join(workflow_location, map_app_config_to_workflow_config[config]))
-
-            job_working_directory = payload['working_directory']
-            # Run pipeline
-            result = subprocess.run([process_python_exe, '-m', 'mapclient.application', '-x', '--headless', '-w', workflow_location], cwd=job_working_directory)
-            # result = subprocess.run(['ls', job_working_directory])
-            if result.returncode == 0:
-                zip_file = os.path.join(job_working_directory, 'scaled_model')
-                shutil.make_archive(zip_file, format='zip', base_dir='model', root_dir=job_working_directory)
-                mark_job_finished(content)
+    payload = content['payload']
+    job_working_directory = payload['working_directory']
+    job_workflow_location = prepare_job_workflow(workflow_location, job_working_directory)
+    # Apply config
+    for config in payload:
+        if config in map_app_config_to_workflow_config.keys():
+            apply_config(payload[config], os.path.join(job_workflow_location, map_app_config_to_workflow_config[config]))
+
+    # Run pipeline
+    if runner is None:
+        runner = SubprocessWorkflowRunner(process_python_exe)
+    returncode = runner.run(job_workflow_location, job_working_directory)
+    if returncode == 0:
+        zip_file = os.path.join(job_working_directory, 'scaled_model')
+        zip_file = shutil.make_archive(zip_file, format='zip', base_dir='model', root_dir=job_working_directory)
+        if content.get('fingerprint'):
+            result_cache.add(content['fingerprint'], zip_file)
+        mark_job_finished(content)
+    else:
+        mark_job_error(content)
+
+
+def main(process_python_exe, workflow_location, working_directory, current_job=None, wake=None):
+    """
+    Process queued jobs until no job has been received for Config.WORKFLOW_IDLE_SHUTDOWN seconds.
+    Between attempts to receive a job the wait doubles, up to Config.WORKFLOW_MAX_WAIT seconds.
+
+    :param current_job: Optional shared character array set to the id and source pid of the job being processed,
+     so that a supervisor can fail the job if this process dies.
+    :param wake: Optional semaphore released when a job is sent, to end a wait early.
+    """
+    runner = workflow_runner(process_python_exe)
+    wait = MIN_WAIT
+    idle_since = time.time()
+    try:
+        while time.time() - idle_since < Config.WORKFLOW_IDLE_SHUTDOWN:
+            content = receive_job()
+            if content is not None:
+                if current_job is not None:
+                    current_job.value = f"{content['id']} {content['source_pid']}".encode()
+                process_job(process_python_exe, workflow_location, content, runner)
+                if current_job is not None:
+                    current_job.value = b''
+                wait = MIN_WAIT
+                idle_since = time.time()
+                continue
+
+            if wake is not None and wake.acquire(timeout=wait):
+                wait = MIN_WAIT
             else:
-                mark_job_error(content)
-            # Reset attempt count after processing job.
-            attempts = 0
+                if wake is None:
+                    time.sleep(wait)
+                wait = min(wait * 2, Config.WORKFLOW_MAX_WAIT)
+    finally:
+        runner.close()
 
 
 if __name__ == "__main__":
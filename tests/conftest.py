@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Config is read when first imported, so the environment is set before any test imports the backend.
+_WORK_DIR = tempfile.mkdtemp(prefix='oms-backend-tests-')
+os.environ['OMS_BACKEND_WORK_DIR'] = _WORK_DIR
+os.environ['OMS_BACKEND_SQL_DATABASE'] = os.path.join(_WORK_DIR, 'oms.sqlite')
+os.environ.setdefault('OMS_BACKEND_WORKFLOW_IDLE_SHUTDOWN', '0')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+
+@pytest.fixture(params=['sql', 'json'])
+def job_queue(request, tmp_path):
+    """
+    An empty job queue of each backend.
+    """
+    from sqlalchemy import create_engine
+
+    from db.prepare import Base
+    import db.tables  # noqa: F401, the tables must be defined before they are created.
+    from process.queue_json import JsonJobQueue
+    from process.queue_sql import SqlJobQueue
+
+    if request.param == 'sql':
+        database_uri = f"sqlite:///{tmp_path / 'jobs.sqlite'}"
+        engine = create_engine(database_uri)
+        Base.metadata.create_all(bind=engine)
+        engine.dispose()
+        return SqlJobQueue(database_uri)
+
+    return JsonJobQueue(str(tmp_path / 'job_queue.json'), str(tmp_path / 'job_queue.json.lock'),
+                        str(tmp_path / 'job_archive.jsonl'), str(tmp_path / 'job_archive.index'),
+                        str(tmp_path / 'job_submitters.json'))
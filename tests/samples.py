@@ -0,0 +1,22 @@
+import math
+
+
+def trc_text(frame_count=50, marker_count=4, name='sample.trc', offset=0.0):
+    """
+    Make the text of a TRC file with frame_count frames of marker_count markers, named M0, M1, ...
+    """
+    markers = [f'M{i}' for i in range(marker_count)]
+    lines = [f"PathFileType\t4\t(X/Y/Z)\t{name}",
+             "DataRate\tCameraRate\tNumFrames\tNumMarkers\tUnits\tOrigDataRate\tOrigDataStartFrame\tOrigNumFrames",
+             f"100.00\t100.00\t{frame_count}\t{marker_count}\tmm\t100.00\t1\t{frame_count}",
+             "Frame#\tTime\t" + "\t".join(marker + "\t\t" for marker in markers),
+             "\t\t" + "\t".join(f"X{i + 1}\tY{i + 1}\tZ{i + 1}" for i in range(marker_count)),
+             ""]
+    for frame in range(frame_count):
+        values = []
+        for marker in range(marker_count):
+            values += [f"{math.sin(frame * 0.01 + marker) * 100 + offset:.5f}", f"{marker * 10 + frame * 0.1:.5f}",
+                       f"{frame * 0.5:.5f}"]
+        lines.append(f"{frame + 1}\t{frame * 0.01:.3f}\t" + "\t".join(values))
+
+    return "\n".join(lines) + "\n"
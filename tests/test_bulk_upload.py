@@ -0,0 +1,62 @@
+import io
+import zipfile
+
+import pytest
+
+from samples import trc_text
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app
+
+    return app.app.test_client()
+
+
+def _without_data_rate(text):
+    lines = text.split('\n')
+    lines[1] = '\t'.join(lines[1].split('\t')[1:])
+    lines[2] = '\t'.join(lines[2].split('\t')[1:])
+    return '\n'.join(lines)
+
+
+def test_failing_file_only_fails_itself(client):
+    files = [
+        (io.BytesIO(trc_text(name='first.trc', offset=1.5).encode()), 'first.trc'),
+        (io.BytesIO(_without_data_rate(trc_text(name='missing.trc', offset=2.5)).encode()), 'missing.trc'),
+        (io.BytesIO(trc_text(name='second.trc', offset=3.5).encode()), 'second.trc'),
+    ]
+    response = client.post('/api/v1/upload/bulk', data={'file': files}, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert [result['status'] for result in response.json['files']] == [201, 400, 201]
+    # The session is left usable.
+    assert client.get('/api/v1/files').status_code == 200
+
+
+def _zip_with_bad_members():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('good.trc', trc_text(name='good.trc', offset=5.5))
+        archive.writestr('corrupt.trc', trc_text(name='corrupt.trc', offset=6.5))
+        archive.writestr('encrypted.trc', trc_text(name='encrypted.trc', offset=7.5))
+
+    content = bytearray(buffer.getvalue())
+    with zipfile.ZipFile(io.BytesIO(bytes(content))) as archive:
+        corrupt = archive.getinfo('corrupt.trc')
+    data_start = corrupt.header_offset + 30 + len(corrupt.filename)
+    content[data_start:data_start + 64] = b'\xff' * 64
+    # Mark the member as encrypted in its central directory entry, the last entry, whose flags are 8 bytes in.
+    central_entry = content.rindex(b'PK\x01\x02')
+    content[central_entry + 8] |= 0x1
+    return bytes(content)
+
+
+def test_bad_archive_members_only_fail_themselves(client):
+    files = [(io.BytesIO(_zip_with_bad_members()), 'members.zip'),
+             (io.BytesIO(b'not an archive'), 'broken.zip')]
+    response = client.post('/api/v1/upload/bulk', data={'file': files}, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert [(result['file_name'], result['status']) for result in response.json['files']] == \
+        [('good.trc', 201), ('corrupt.trc', 400), ('encrypted.trc', 400), ('broken.zip', 400)]
@@ -0,0 +1,35 @@
+import io
+import os
+import threading
+
+import pytest
+
+from samples import trc_text
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app
+
+    return app.app.test_client()
+
+
+def test_concurrent_uploads_of_the_same_content_store_it_once(client):
+    from config import Config
+
+    content = trc_text(name='same.trc', offset=4.5).encode()
+    statuses = []
+
+    def upload():
+        response = client.post('/api/v1/upload', data={'file': (io.BytesIO(content), 'same.trc')},
+                               content_type='multipart/form-data')
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=upload) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [200, 200, 200, 201]
+    assert not [name for name in os.listdir(Config.INGEST_DIR) if name.endswith('.lock')]
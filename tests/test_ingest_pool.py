@@ -0,0 +1,55 @@
+import io
+import os
+import re
+import time
+
+import pytest
+
+from samples import trc_text
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app
+
+    return app.app.test_client()
+
+
+def _ingest_files(suffix):
+    from config import Config
+
+    return [name for name in os.listdir(Config.INGEST_DIR) if name.endswith(suffix)]
+
+
+def test_async_upload_removes_spool(client):
+    response = client.post('/api/v1/upload?mode=async',
+                           data={'file': (io.BytesIO(trc_text(name='async.trc', offset=4.5).encode()), 'async.trc')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    # The response is not strict JSON, like the other upload responses.
+    ingest_id = re.search(r"ingest_id: '([^']+)'", response.get_data(as_text=True)).group(1)
+
+    deadline = time.time() + 30
+    while client.get(f'/api/v1/upload/status?id={ingest_id}').json['status'] not in ('finished', 'error'):
+        assert time.time() < deadline
+        time.sleep(0.05)
+
+    assert client.get(f'/api/v1/upload/status?id={ingest_id}').json['result']['status'] == 201
+    assert f'{ingest_id}.trc' not in _ingest_files('.trc')
+
+
+def test_expire_ingests():
+    from config import Config
+    from ingest.pool import expire_ingests
+
+    os.makedirs(Config.INGEST_DIR, exist_ok=True)
+    old = time.time() - 3600
+    for name in ['old.json', 'old.trc']:
+        path = os.path.join(Config.INGEST_DIR, name)
+        open(path, 'w').close()
+        os.utime(path, (old, old))
+    open(os.path.join(Config.INGEST_DIR, 'new.json'), 'w').close()
+
+    assert expire_ingests(60) == 2
+    assert 'old.json' not in _ingest_files('.json') and 'new.json' in _ingest_files('.json')
+    assert 'old.trc' not in _ingest_files('.trc')
@@ -0,0 +1,118 @@
+import time
+
+from process import queue_sql, scheduler
+from process.job_controls import JobRemoval, JobState
+from process.job_manager import create_job
+
+
+def _send(job_queue, job_id, **kwargs):
+    job_queue.send_job(create_job(job_id, {'n': job_id}, **kwargs))
+
+
+def test_send_and_receive(job_queue):
+    _send(job_queue, 'job')
+
+    assert job_queue.get_job_state('job') == JobState.QUEUED
+    job = job_queue.receive_job()
+    assert (job['id'], job['payload'], job['state']) == ('job', {'n': 'job'}, JobState.RUNNING)
+    assert job_queue.get_job_state('job') == JobState.RUNNING
+    assert job_queue.receive_job() is None
+
+    job_queue.mark_job_finished(job)
+    assert job_queue.get_job_state('job') == JobState.FINISHED
+    assert job_queue.is_job_finished('job')
+    assert job_queue.get_job_state('other') == 'unknown'
+
+
+def test_remove(job_queue):
+    for job_id in ['running', 'queued']:
+        _send(job_queue, job_id)
+    job_queue.receive_job()
+
+    assert job_queue.remove_job('queued') == JobRemoval.REMOVED
+    assert job_queue.remove_job('running') is None
+    assert job_queue.remove_job('missing') is None
+    assert [job_queue.get_job_state(job_id) for job_id in ['running', 'queued']] == [JobState.RUNNING, 'unknown']
+
+
+def test_archive(job_queue):
+    for job_id in ['finished', 'error', 'queued']:
+        _send(job_queue, job_id)
+    job_queue.mark_job_finished(job_queue.receive_job())
+    job_queue.mark_job_error(job_queue.receive_job())
+
+    assert job_queue.archive_jobs() == 2
+    assert job_queue.archive_jobs() == 0
+    assert [job['id'] for job in job_queue.list_jobs()] == ['queued']
+    assert [job_queue.get_job_state(job_id) for job_id in ['finished', 'error', 'queued']] == \
+        [JobState.FINISHED, JobState.ERROR, JobState.QUEUED]
+
+
+def test_archive_in_batches(job_queue, monkeypatch):
+    monkeypatch.setattr(queue_sql, '_ID_BATCH_SIZE', 2)
+    for index in range(5):
+        _send(job_queue, f"job-{index}")
+        job_queue.mark_job_finished(job_queue.receive_job())
+
+    assert job_queue.archive_jobs() == 5
+    assert job_queue.list_jobs() == []
+    assert [job_queue.get_job_state(f"job-{index}") for index in range(5)] == [JobState.FINISHED] * 5
+
+
+def test_prune_archive(job_queue):
+    for job_id in ['first', 'second', 'third']:
+        _send(job_queue, job_id)
+        job_queue.mark_job_finished(job_queue.receive_job())
+        job_queue.archive_jobs()
+
+    assert job_queue.prune_archive(0, 0) == []
+    assert sorted(job_queue.prune_archive(0, 1)) == ['first', 'second']
+    assert [job_queue.get_job_state(job_id) for job_id in ['first', 'second', 'third']] == \
+        ['unknown', 'unknown', JobState.FINISHED]
+
+
+def test_remove_archived(job_queue):
+    _send(job_queue, 'archived')
+    job_queue.mark_job_finished(job_queue.receive_job())
+    job_queue.archive_jobs()
+
+    assert job_queue.remove_job('archived') == JobRemoval.REMOVED
+    assert job_queue.get_job_state('archived') == 'unknown'
+    assert job_queue.remove_job('archived') is None
+
+
+def test_receive_in_scheduled_order(job_queue, monkeypatch):
+    monkeypatch.setattr(scheduler.Config, 'JOB_SUBMITTER_MAX_RUNNING', 1)
+    _send(job_queue, 'a1', submitter='a')
+    _send(job_queue, 'a2', submitter='a')
+    _send(job_queue, 'b1', submitter='b')
+    _send(job_queue, 'urgent', submitter='c', priority=3)
+
+    assert [job_queue.receive_job()['id'] for _ in range(3)] == ['urgent', 'a1', 'b1']
+    # a1 is running, so a2 is held.
+    assert job_queue.receive_job() is None
+    assert [entry.get('held') for entry in scheduler.schedule(job_queue.list_jobs(), job_queue.served_times())
+            if entry['id'] == 'a2'] == [True]
+
+
+def test_late_submitter_is_served_next(job_queue):
+    for index in range(5):
+        _send(job_queue, f'a{index}', submitter='a')
+    job = job_queue.receive_job()
+    _send(job_queue, 'b', submitter='b')
+    job_queue.mark_job_finished(job)
+
+    assert job_queue.receive_job()['id'] == 'b'
+    assert set(job_queue.served_times()) == {'a', 'b'}
+
+
+def test_forget_submitters(job_queue):
+    _send(job_queue, 'a', submitter='a')
+    job_queue.receive_job()
+
+    job_queue.prune_archive(3600, 0)
+    assert set(job_queue.served_times()) == {'a'}
+    time.sleep(0.01)
+    job_queue.prune_archive(0.001, 0)
+    assert job_queue.served_times() == {}
+
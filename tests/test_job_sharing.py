@@ -0,0 +1,51 @@
+from process.job_controls import JobRemoval, JobState
+from process.job_manager import create_job
+
+
+def _send(job_queue, job_id, priority=0, fingerprint='same'):
+    job_queue.send_job(create_job(job_id, {'n': job_id}, fingerprint, priority=priority))
+
+
+def _priority(job_queue, job_id):
+    return next(job['priority'] for job in job_queue.list_jobs() if job['id'] == job_id)
+
+
+def test_sharing_raises_priority_to_the_highest(job_queue):
+    _send(job_queue, 'shared', priority=1)
+
+    assert job_queue.share_active_job('same', 5) == 'shared'
+    assert _priority(job_queue, 'shared') == 5
+    assert job_queue.share_active_job('same', 2) == 'shared'
+    assert _priority(job_queue, 'shared') == 5
+    assert job_queue.share_active_job('other', 0) is None
+
+
+def test_removing_a_shared_job_removes_one_submission(job_queue):
+    _send(job_queue, 'shared')
+    job_queue.share_active_job('same', 0)
+
+    assert job_queue.remove_job('shared') == JobRemoval.RELEASED
+    assert job_queue.get_job_state('shared') == JobState.QUEUED
+    assert job_queue.remove_job('shared') == JobRemoval.REMOVED
+    assert job_queue.get_job_state('shared') == 'unknown'
+    assert job_queue.remove_job('shared') is None
+
+
+def test_removing_an_archived_shared_job_removes_one_submission(job_queue):
+    _send(job_queue, 'shared')
+    job_queue.share_active_job('same', 0)
+    job_queue.mark_job_finished(job_queue.receive_job())
+    job_queue.archive_jobs()
+
+    assert job_queue.remove_job('shared') == JobRemoval.RELEASED
+    assert job_queue.get_job_state('shared') == JobState.FINISHED
+    assert job_queue.remove_job('shared') == JobRemoval.REMOVED
+    assert job_queue.get_job_state('shared') == 'unknown'
+
+
+def test_running_job_is_not_removed(job_queue):
+    _send(job_queue, 'running')
+    job_queue.receive_job()
+
+    assert job_queue.remove_job('running') is None
+    assert job_queue.get_job_state('running') == JobState.RUNNING
@@ -0,0 +1,68 @@
+import tempfile
+
+import numpy as np
+import pytest
+
+from trc import TRCData
+
+from db.trajectories import FRAME_DTYPE, decode_trajectory
+from ingest.parser import TRCFormatError, TRCStreamParser
+
+from samples import trc_text
+
+
+def _with_short_row(text):
+    # A row missing the coordinates of its last markers.
+    lines = text.split('\n')
+    lines[10] = '\t'.join(lines[10].split('\t')[:2 + 6])
+    return '\n'.join(lines)
+
+
+def _with_text_value(text):
+    lines = text.split('\n')
+    values = lines[11].split('\t')
+    values[3] = 'abc'
+    lines[11] = '\t'.join(values)
+    return '\n'.join(lines)
+
+
+SAMPLES = {
+    'plain': trc_text(),
+    'crlf': trc_text(marker_count=3).replace('\n', '\r\n'),
+    'many frames': trc_text(frame_count=5000, marker_count=2),
+    'short row': _with_short_row(trc_text(frame_count=20)),
+    'text value': _with_text_value(trc_text(frame_count=20)),
+}
+
+
+def _parse(content, chunk_size):
+    spool = tempfile.TemporaryFile()
+    parser = TRCStreamParser(spool)
+    for start in range(0, len(content), chunk_size):
+        parser.feed(content[start:start + chunk_size])
+    parser.close()
+    return parser, dict(parser.channels())
+
+
+@pytest.mark.parametrize('chunk_size', [7, 1000, 10 ** 6])
+@pytest.mark.parametrize('name', SAMPLES)
+def test_parser_matches_trc_data_reader(name, chunk_size):
+    text = SAMPLES[name]
+    reference = TRCData()
+    reference.parse(text)
+
+    parser, channels = _parse(text.encode(), chunk_size)
+
+    assert parser.header == {key: reference[key] for key in parser.header}
+    assert parser.row_count == len(reference['Frame#'])
+    assert decode_trajectory(channels['Frame#'], FRAME_DTYPE, None).tolist() == reference['Frame#']
+    assert np.allclose(decode_trajectory(channels['Time'], width=None), reference['Time'])
+    for marker in reference['Markers']:
+        assert np.allclose(decode_trajectory(channels[marker]), np.array(reference[marker]), equal_nan=True)
+
+
+@pytest.mark.parametrize('text', ['', 'garbage', '\n'.join(trc_text().split('\n')[:4]),
+                                  trc_text().replace('Frame#', 'Frm')])
+def test_parser_rejects_invalid_content(text):
+    with pytest.raises(TRCFormatError):
+        _parse(text.encode(), 100)
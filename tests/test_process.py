@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app
+
+    return app.app.test_client()
+
+
+def _process(client, hash_):
+    return client.post('/api/v1/process', json={'file': {'hash': hash_}, 'demographic': {'id': 'missing'},
+                                                'conversion': {'name': 'missing'}})
+
+
+@pytest.mark.parametrize('hash_', ['../../x', 'A' * 64, '0' * 63, 7])
+def test_invalid_hash_is_rejected(client, hash_):
+    from config import Config
+
+    before = set(os.listdir(Config.WORK_DIR))
+    assert _process(client, hash_).status_code == 400
+    assert set(os.listdir(Config.WORK_DIR)) == before
+
+
+def test_unknown_hash_is_not_found(client):
+    from config import Config
+
+    before = set(os.listdir(Config.WORK_DIR))
+    assert _process(client, '0' * 64).status_code == 404
+    assert set(os.listdir(Config.WORK_DIR)) == before
+
+
+def test_cache_rejects_keys_outside_its_directory(tmp_path):
+    from cache.common import DirectoryCache
+
+    cache = DirectoryCache(str(tmp_path / 'cache'), 1024, '.trc')
+    source = tmp_path / 'source.trc'
+    source.write_text('content')
+
+    with pytest.raises(ValueError):
+        cache.add('../outside', str(source))
+    with pytest.raises(ValueError):
+        cache.link('../outside', str(tmp_path / 'destination.trc'))
+    assert not (tmp_path / 'outside.trc').exists()
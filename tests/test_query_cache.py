@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import event
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app
+
+    return app.app.test_client()
+
+
+@pytest.fixture
+def statements():
+    from db.common import engine
+
+    executed = []
+
+    def count(*_):
+        executed.append(1)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', count)
+
+
+def _create_demographic(client, id_, age):
+    client.post('/api/v1/create/demographic', json={'id': id_, 'height': 1.8, 'mass': 80, 'age': age,
+                                                     'gender': 'male', 'visibility': 'public'})
+
+
+def _write_elsewhere(id_, age):
+    # A write by another process, through its own connection.
+    from db.common import engine
+    from db.generations import bump_generations
+    from db.tables import Demographic
+
+    with engine.begin() as connection:
+        connection.execute(Demographic.__table__.update().where(Demographic.demographic_id == id_).values(age=age))
+        bump_generations(connection, [Demographic.__tablename__])
+
+
+def test_cached_lookup_does_not_query(client, statements, monkeypatch):
+    from db import queries
+
+    monkeypatch.setattr(queries.Config, 'QUERY_CACHE_CHECK_INTERVAL', 60)
+    _create_demographic(client, 'cached', 30)
+    assert queries.demographic('cached').age == 30
+
+    del statements[:]
+    assert queries.demographic('cached').age == 30
+    assert statements == []
+
+
+def test_write_in_this_process_is_seen_at_once(client, monkeypatch):
+    from db import queries
+
+    monkeypatch.setattr(queries.Config, 'QUERY_CACHE_CHECK_INTERVAL', 60)
+    _create_demographic(client, 'local', 30)
+    assert queries.demographic('local').age == 30
+
+    _write_elsewhere('local', 31)
+    assert queries.demographic('local').age == 30
+    queries.invalidate_tables(['demographics'])
+    assert queries.demographic('local').age == 31
+
+
+def test_write_by_another_process_is_seen_after_the_check_interval(client, monkeypatch):
+    from db import queries
+
+    monkeypatch.setattr(queries.Config, 'QUERY_CACHE_CHECK_INTERVAL', 0)
+    _create_demographic(client, 'remote', 30)
+    assert queries.demographic('remote').age == 30
+
+    _write_elsewhere('remote', 32)
+    assert queries.demographic('remote').age == 32
@@ -0,0 +1,96 @@
+from process import scheduler
+from process.job_controls import JobState
+
+
+def _job(id_, state=JobState.QUEUED, priority=0, submitter=None, queued_at=0.0):
+    return {'id': id_, 'state': state, 'priority': priority, 'submitter': submitter, 'queued_at': queued_at}
+
+
+def _order(jobs, served=None):
+    # The ids in the order the jobs are claimed, marking each claimed job as running.
+    jobs = [dict(job) for job in jobs]
+    served = dict(served or {})
+    order = []
+    while True:
+        job = scheduler.next_job(jobs, served)
+        if job is None:
+            return order
+        job['state'] = JobState.RUNNING
+        served[scheduler.submitter_key(job['submitter'])] = len(order) + 1.0
+        order.append(job['id'])
+
+
+def test_higher_priority_first_then_order_sent():
+    jobs = [_job('late', queued_at=3.0), _job('early', queued_at=1.0), _job('urgent', priority=2, queued_at=5.0),
+            _job('low', priority=-1)]
+
+    assert _order(jobs) == ['urgent', 'early', 'late', 'low']
+
+
+def test_submitters_take_turns():
+    jobs = [_job('a1', submitter='a', queued_at=0.0), _job('a2', submitter='a', queued_at=1.0),
+            _job('a3', submitter='a', queued_at=2.0), _job('b1', submitter='b', queued_at=3.0),
+            _job('b2', submitter='b', queued_at=4.0)]
+
+    assert _order(jobs) == ['a1', 'b1', 'a2', 'b2', 'a3']
+
+
+def test_least_recently_served_first():
+    jobs = [_job('a1', submitter='a', queued_at=0.0), _job('b1', submitter='b', queued_at=1.0)]
+
+    assert scheduler.next_job(jobs, {'a': 10.0, 'b': 5.0})['id'] == 'b1'
+    assert scheduler.next_job(jobs, {'a': 10.0})['id'] == 'b1'
+    assert scheduler.next_job(jobs, {})['id'] == 'a1'
+
+
+def test_fewest_running_first():
+    jobs = [_job('a-running', state=JobState.RUNNING, submitter='a'), _job('a1', submitter='a', queued_at=0.0),
+            _job('b1', submitter='b', queued_at=1.0)]
+
+    assert scheduler.next_job(jobs, {'a': 1.0, 'b': 2.0})['id'] == 'b1'
+
+
+def test_long_jobs_do_not_starve_a_late_submitter():
+    # One worker, jobs taking 300 s, one submitter sends 200 jobs at once and another sends a job an hour later.
+    # Jobs are claimed every 300 s, the late job is sent during the job claimed at 3600 s.
+    jobs = [_job(f'a{index}', submitter='a', queued_at=0.0) for index in range(200)]
+    served = {}
+    now = 0.0
+    started = {}
+    while 'b' not in started:
+        if now > 3600.0 and not any(job['id'] == 'b' for job in jobs):
+            jobs.append(_job('b', submitter='b', queued_at=3650.0))
+        job = scheduler.next_job(jobs, served)
+        job['state'] = JobState.RUNNING
+        served[scheduler.submitter_key(job['submitter'])] = now
+        started[job['id']] = now
+        now += 300.0
+        job['state'] = JobState.FINISHED
+
+    # The late job runs as soon as the job running when it is sent is done.
+    assert started['b'] == 3900.0
+
+
+def test_submitter_running_cap(monkeypatch):
+    monkeypatch.setattr(scheduler.Config, 'JOB_SUBMITTER_MAX_RUNNING', 1)
+    jobs = [_job('a-running', state=JobState.RUNNING, submitter='a'), _job('a-queued', submitter='a'),
+            _job('b-queued', submitter='b', queued_at=10.0), _job('anonymous', queued_at=20.0)]
+
+    assert scheduler.next_job(jobs, {})['id'] == 'b-queued'
+    assert _order(jobs) == ['b-queued', 'anonymous']
+    assert [entry.get('held') for entry in scheduler.schedule(jobs, {})] == [None, True, False, False]
+
+
+def test_no_running_cap(monkeypatch):
+    monkeypatch.setattr(scheduler.Config, 'JOB_SUBMITTER_MAX_RUNNING', 0)
+    jobs = [_job('a-running', state=JobState.RUNNING, submitter='a'), _job('a-queued', submitter='a')]
+
+    assert _order(jobs) == ['a-queued']
+
+
+def test_schedule_positions_take_turns():
+    jobs = [_job('a1', submitter='a', queued_at=0.0), _job('a2', submitter='a', queued_at=1.0),
+            _job('done', state=JobState.FINISHED), _job('b1', submitter='b', queued_at=2.0)]
+
+    assert [(entry['id'], entry.get('position')) for entry in scheduler.schedule(jobs, {})] == \
+        [('a1', 1), ('a2', 3), ('done', None), ('b1', 2)]
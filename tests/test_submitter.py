@@ -0,0 +1,48 @@
+import pytest
+
+
+@pytest.fixture(scope='module')
+def app_module():
+    import app
+
+    return app
+
+
+def _submitter(app_module, **kwargs):
+    with app_module.app.test_request_context('/api/v1/process', method='POST', **kwargs):
+        return app_module._submitter()
+
+
+def test_submitter_is_the_remote_address_by_default(app_module):
+    assert _submitter(app_module, headers={'X-Remote-User': 'someone'},
+                      environ_base={'REMOTE_ADDR': '10.0.0.1'}) == '10.0.0.1'
+
+
+def test_submitter_from_trusted_header(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.Config, 'SUBMITTER_HEADER', 'X-Remote-User')
+
+    assert _submitter(app_module, headers={'X-Remote-User': 'someone'},
+                      environ_base={'REMOTE_ADDR': '10.0.0.1'}) == 'someone'
+    assert _submitter(app_module, environ_base={'REMOTE_ADDR': '10.0.0.1'}) == '10.0.0.1'
+
+
+def test_authenticated_user_comes_first(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.Config, 'SUBMITTER_HEADER', 'X-Remote-User')
+
+    assert _submitter(app_module, headers={'X-Remote-User': 'someone'},
+                      environ_base={'REMOTE_ADDR': '10.0.0.1', 'REMOTE_USER': 'user'}) == 'user'
+
+
+def test_listing_shows_only_the_callers_submitter(app_module):
+    from process.job_manager import create_job, remove_job, send_job
+
+    send_job(create_job('mine', {}, submitter='10.0.0.1'))
+    send_job(create_job('theirs', {}, submitter='10.0.0.2'))
+    try:
+        response = app_module.app.test_client().get('/api/v1/job/list', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+        jobs = {job['id']: job for job in response.json['jobs']}
+        assert jobs['mine']['submitter'] == '10.0.0.1'
+        assert 'submitter' not in jobs['theirs']
+    finally:
+        remove_job('mine')
+        remove_job('theirs')
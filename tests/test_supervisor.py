@@ -0,0 +1,19 @@
+from process import job_manager
+from process.job_manager import active_job_count, create_job
+from process.supervisor import workers_wanted
+
+
+def test_workers_wanted():
+    assert workers_wanted(4, 0) == 0
+    assert workers_wanted(4, 1) == 1
+    assert workers_wanted(4, 9) == 4
+
+
+def test_active_job_count(job_queue, monkeypatch):
+    monkeypatch.setattr(job_manager, 'job_queue', lambda: job_queue)
+    for job_id in ['finished', 'running', 'queued']:
+        job_queue.send_job(create_job(job_id, {'n': job_id}))
+    job_queue.mark_job_finished(job_queue.receive_job())
+    job_queue.receive_job()
+
+    assert active_job_count() == 2
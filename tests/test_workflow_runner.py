@@ -0,0 +1,35 @@
+import sys
+
+from config import Config
+
+from process.workflow import ResidentWorkflowRunner, SubprocessWorkflowRunner, workflow_runner
+
+
+def _install_mapclient(path, application_source):
+    package = path / 'mapclient'
+    package.mkdir()
+    (package / '__init__.py').write_text('')
+    (package / 'application.py').write_text(application_source)
+
+
+def test_resident_runner_with_supported_mapclient(tmp_path, monkeypatch):
+    _install_mapclient(tmp_path, 'def _prepare_application():\n    pass\n\n\ndef prepare_sans_gui_app(app):\n    pass\n')
+    monkeypatch.setenv('PYTHONPATH', str(tmp_path))
+    monkeypatch.setattr(Config, 'WORKFLOW_RUNNER', 'resident')
+
+    assert isinstance(workflow_runner(sys.executable), ResidentWorkflowRunner)
+
+
+def test_resident_runner_falls_back_without_private_functions(tmp_path, monkeypatch, capsys):
+    _install_mapclient(tmp_path, 'def prepare_sans_gui_app(app):\n    pass\n')
+    monkeypatch.setenv('PYTHONPATH', str(tmp_path))
+    monkeypatch.setattr(Config, 'WORKFLOW_RUNNER', 'resident')
+
+    assert isinstance(workflow_runner(sys.executable), SubprocessWorkflowRunner)
+    assert 'Warning' in capsys.readouterr().out
+
+
+def test_stub_runner_is_not_checked(monkeypatch):
+    monkeypatch.setattr(Config, 'WORKFLOW_RUNNER', 'stub')
+
+    assert isinstance(workflow_runner(sys.executable), ResidentWorkflowRunner)